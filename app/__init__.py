@@ -2,11 +2,28 @@
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from pathlib import Path
 
 # Initialize SQLAlchemy outside the function
 db = SQLAlchemy()
 
+# PRAGMAs applied to every new SQLite connection (read-heavy reference workload)
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-64000',     # ~64 MB page cache
+    'PRAGMA mmap_size=268435456',   # 256 MB memory-mapped I/O
+)
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Engine 'connect' listener that tunes each SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
 def create_app(config_object='config.Config'):
     """Application factory function."""
     
@@ -22,12 +39,34 @@ def create_app(config_object='config.Config'):
     db_path = instance_path / 'vin.db'
     
     # CRITICAL FIX: Set the URI here on the app config object
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    # (unless the config object already points at another database)
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', f"sqlite:///{db_path}")
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    is_sqlite = database_uri.startswith('sqlite')
+    engine_options = {
+        'pool_size': 10,
+        'pool_pre_ping': False,
+    }
+    if is_sqlite:
+        engine_options['connect_args'] = {'check_same_thread': False}
+    else:
+        # Networked databases: allow bursts past pool_size and drop dead
+        # connections on checkout instead of failing mid-seed
+        engine_options['max_overflow'] = 10
+        engine_options['pool_pre_ping'] = True
+    if database_uri.startswith(('postgresql://', 'postgresql+psycopg2://')):
+        # psycopg2: send executemany() as large multi-row batches, not row by row
+        engine_options['executemany_mode'] = 'values_plus_batch'
+        engine_options['insertmanyvalues_page_size'] = 1000
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
 
     # 3. Initialize extensions
     # Now db.init_app(app) can access the required configuration
     db.init_app(app)
+    if is_sqlite:
+        with app.app_context():
+            event.listen(db.engine, 'connect', set_sqlite_pragmas)
 
     # 4. Import models so SQLAlchemy knows about them (Crucial for db.create_all() in main.py)
     from app.models import country 
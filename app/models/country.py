@@ -1,10 +1,8 @@
 # app/models/country.py
 from app import db # Assuming 'db' is initialized in app/__init__.py
-from sqlalchemy_serializer import SerializerMixin
 from sqlalchemy.orm import relationship
-from sqlalchemy.ext.hybrid import hybrid_property
 
-class Country(db.Model, SerializerMixin):
+class Country(db.Model):
     __tablename__ = 'countries'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -1,9 +1,8 @@
 # app/models/factory_logo.py
 from app import db
-from sqlalchemy_serializer import SerializerMixin
 from sqlalchemy.orm import relationship
 
-class FactoryLogo(db.Model, SerializerMixin):
+class FactoryLogo(db.Model):
     __tablename__ = 'factory_logos'
 
     id = db.Column(db.Integer, primary_key=True)
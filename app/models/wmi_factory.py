@@ -1,9 +1,8 @@
 # app/models/wmi_factory.py
 from app import db 
-from sqlalchemy_serializer import SerializerMixin
 from sqlalchemy.orm import relationship 
 
-class WmiFactory(db.Model, SerializerMixin):
+class WmiFactory(db.Model):
     __tablename__ = 'wmi_factories' # Renamed table
 
     id = db.Column(db.Integer, primary_key=True)
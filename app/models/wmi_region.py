@@ -1,9 +1,8 @@
 # app/models/wmi_region.py
 from app import db
-from sqlalchemy_serializer import SerializerMixin
 from sqlalchemy.orm import relationship
 
-class WmiRegion(db.Model, SerializerMixin):
+class WmiRegion(db.Model):
     __tablename__ = 'wmi_regions' # Renamed table
 
     id = db.Column(db.Integer, primary_key=True)
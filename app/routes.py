@@ -5,13 +5,30 @@ from app.models.country import Country
 from app.models.wmi_region import WmiRegion # Corrected model name
 from app.models.wmi_factory import WmiFactory # Corrected model name
 from app.models.factory_logo import FactoryLogo # New logo model
-from sqlalchemy import text, func, select
-from sqlalchemy.orm import joinedload 
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, load_only, selectinload
+import functools
+import hmac
+import logging
 import random
+import threading
+import time
+import types
 from datetime import datetime
 import os
 import sys
-import re
+
+# NumPy is optional: it vectorizes batch check digits and backs the Numba kernels below
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Numba is optional as well: when present the scalar check digit is JIT-compiled
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 # Define a Blueprint for organization
 bp = Blueprint('main', __name__)
@@ -35,100 +52,374 @@ MODEL_YEARS = {
     'W': 2028, 'X': 2029, 'Y': 2030, '1': 2031, '2': 2032, '3': 2033,
     '4': 2034, '5': 2035, '6': 2036, '7': 2037, '8': 2038, '9': 2039
 }
+
+# Precomputed lookup tables (built once at import time)
+# TRANS_TABLE maps every byte value to its transliterated VIN value (0 for
+# bytes outside the VIN alphabet), indexed directly by the encoded VIN bytes.
+TRANS_TABLE = bytes(TRANSLITERATION.get(chr(i), 0) for i in range(256))
+INVALID_SET = frozenset(INVALID_CHARS)
+VIN_CHAR_SET = frozenset(VIN_CHARACTERS)
+NORTH_AMERICAN_CHARS = frozenset('12345')
+# 1 for every byte that is not a valid VIN character (so I, O and Q are rejected too);
+# translating a VIN through it and testing for a 1 checks all characters in one C pass
+VIN_REJECT_TABLE = bytes(0 if chr(i) in VIN_CHAR_SET else 1 for i in range(256))
+
+# NumPy equivalents of the tables above for batch validation and the Numba kernels
+if np is not None:
+    LUT = np.frombuffer(TRANS_TABLE, dtype=np.uint8)
+    WEIGHTS_ARRAY = np.array(WEIGHTS, dtype=np.int32)
+    REJECT_ARRAY = np.frombuffer(VIN_REJECT_TABLE, dtype=np.uint8)
 # --- END VIN CONSTANTS ---
 
 
 # --- VIN UTILITY FUNCTIONS (Adapted to use current models) ---
 
+if njit is not None and np is not None:
+    @njit(cache=True)
+    def _vin_kernel(vin_bytes):
+        """
+        Validate every character and compute the check digit in one native pass.
+        Returns the check digit's ASCII code, or 0 if any character is invalid.
+        """
+        total = 0
+        for i in range(VIN_LENGTH):
+            b = vin_bytes[i]
+            if REJECT_ARRAY[b]:
+                return 0
+            total += LUT[b] * WEIGHTS_ARRAY[i]
+        remainder = total % 11
+        return 88 if remainder == 10 else 48 + remainder  # ord('X') / ord('0')
+
+    # Pre-warm so the first request doesn't pay the compile cost
+    _vin_kernel(np.frombuffer(b'1HGCM82633A004352', dtype=np.uint8))
+else:
+    _vin_kernel = None
+
 def compute_check_digit(vin):
-    """Compute VIN check digit"""
-    total = sum(TRANSLITERATION.get(vin[i], 0) * WEIGHTS[i] for i in range(VIN_LENGTH))
-    remainder = total % 11
+    """Compute VIN check digit (characters outside the VIN alphabet count as 0)"""
+    if _vin_kernel is not None and len(vin) == VIN_LENGTH and vin.isascii():
+        code = _vin_kernel(np.frombuffer(vin.encode('ascii'), dtype=np.uint8))
+        if code:
+            return chr(code)
+    # Non-ASCII characters become '?', which TRANS_TABLE maps to 0
+    vin_bytes = vin.encode('ascii', 'replace')
+    remainder = sum(TRANS_TABLE[b] * w for b, w in zip(vin_bytes, WEIGHTS)) % 11
     return 'X' if remainder == 10 else str(remainder)
 
-def validate_check_digit(vin):
-    """Validate VIN check digit"""
-    computed = compute_check_digit(vin)
-    return vin[8] == computed
-
-def is_north_american(vin):
-    """Check if VIN is from North America (1-5)"""
-    return vin[0] in '12345'
+def compute_check_digits(vins):
+    """
+    Compute check digits for many VINs at once (returns a list of chars).
+    With NumPy the whole batch is one lookup-table gather and one matmul;
+    every VIN must already be 17 valid VIN characters.
+    """
+    if not vins:
+        return []
+    if np is None:
+        return [compute_check_digit(vin) for vin in vins]
+
+    raw = b''.join(vin.encode('ascii') for vin in vins)
+    bytes_arr = np.frombuffer(raw, dtype=np.uint8).reshape(len(vins), VIN_LENGTH)
+    totals = LUT[bytes_arr].astype(np.int32) @ WEIGHTS_ARRAY
+    remainder = totals % 11
+    check_chars = np.where(remainder == 10, ord('X'), ord('0') + remainder).astype(np.uint8)
+    return list(check_chars.tobytes().decode('ascii'))
+
+def is_valid_vin_format(vin):
+    """True if vin is exactly 17 valid VIN characters"""
+    return (
+        len(vin) == VIN_LENGTH
+        and vin.isascii()
+        and 1 not in vin.encode('ascii').translate(VIN_REJECT_TABLE)
+    )
 
-def resolve_model_year(char):
-    """Resolve model year with 30-year cycle"""
+def scan_vin(vin, need_check=True):
+    """
+    Validate a VIN's format and compute its check digit.
+    Returns (is_valid_format, computed_check_digit); the fallback path skips the
+    check digit (None) when need_check is False, the JIT kernel always has it.
+    """
+    if _vin_kernel is not None:
+        if len(vin) != VIN_LENGTH or not vin.isascii():
+            return False, None
+        code = _vin_kernel(np.frombuffer(vin.encode('ascii'), dtype=np.uint8))
+        return (True, chr(code)) if code else (False, None)
+
+    if not is_valid_vin_format(vin):
+        return False, None
+    return True, compute_check_digit(vin) if need_check else None
+
+def _compute_model_year(char, current_year):
+    """Resolve model year with 30-year cycle for a given current year"""
     base_year = MODEL_YEARS.get(char)
     if not base_year:
         return None
-    current_year = datetime.now().year
     year = base_year
     if year < current_year - 30:
         year += 30
     return year if year <= current_year else None
 
-def get_factory_logos(factory_id):
-    """Get all logos for a factory using SQLAlchemy/FactoryLogo model"""
-    logos = db.session.scalars(
-        select(FactoryLogo.logo_filename).filter(FactoryLogo.factory_id == factory_id)
-    ).all()
-    return logos
+# Memoized {char: year_or_None} table, rebuilt only when the calendar year changes
+_YEAR_CACHE = {}
+# Epoch timestamp of the next local New Year; until then the tables stay valid,
+# so the hot path costs a float comparison instead of building a datetime
+_YEAR_CACHE_EXPIRES = 0.0
+# Model year characters that resolve to a non-future year (refreshed with _YEAR_CACHE)
+VALID_YEAR_CHARS = ()
+
+def _refresh_year_cache():
+    """Rebuild the model-year tables if the current year has changed"""
+    global _YEAR_CACHE, _YEAR_CACHE_EXPIRES, VALID_YEAR_CHARS
+    if time.time() < _YEAR_CACHE_EXPIRES:
+        return
+    current_year = datetime.now().year
+    _YEAR_CACHE = {char: _compute_model_year(char, current_year) for char in MODEL_YEARS}
+    VALID_YEAR_CHARS = tuple(char for char, year in _YEAR_CACHE.items() if year)
+    _YEAR_CACHE_EXPIRES = datetime(current_year + 1, 1, 1).timestamp()
+
+def resolve_model_year(char):
+    """Resolve model year with 30-year cycle"""
+    _refresh_year_cache()
+    return _YEAR_CACHE.get(char)
+
+def get_valid_year_chars():
+    """Return the model year characters that are not in the future"""
+    _refresh_year_cache()
+    return VALID_YEAR_CHARS
+
+# --- REFERENCE DATA CACHE ---
+# WMI factories (and their logos) are read-only reference data, so they are
+# loaded once per process into plain dicts keyed by WMI instead of being
+# queried on every decode.
+_factory_cache = None
+# Tuple of every cached WMI, for O(1) random sampling in generate_vin
+_wmi_pool = ()
+_factory_cache_lock = threading.Lock()
+
+def _load_factory_cache():
+    """Build the WMI -> factory dict in a single round-trip (factory + country + logos)"""
+    rows = db.session.execute(
+        select(
+            WmiFactory.id, WmiFactory.wmi, WmiFactory.name, WmiFactory.region,
+            Country.id, Country.common_name, Country.flag_emoji, Country.region,
+            FactoryLogo.logo_filename
+        )
+        .outerjoin(Country, WmiFactory.country_id == Country.id)
+        .outerjoin(FactoryLogo, FactoryLogo.factory_id == WmiFactory.id)
+        .order_by(WmiFactory.id, FactoryLogo.logo_filename)
+    )
+
+    cache = {}
+    for f_id, wmi, name, f_region, country_id, common_name, flag_emoji, c_region, logo_filename in rows:
+        entry = cache.get(wmi)
+        if entry is None:
+            entry = cache[wmi] = {
+                'id': f_id,
+                'name': name,
+                'region': f_region,
+                # None when the factory is not linked to a Country
+                'country': {
+                    'common_name': common_name,
+                    'flag_emoji': flag_emoji,
+                    'region': c_region,
+                } if country_id is not None else None,
+                'logos': [],
+            }
+        # The LEFT JOIN yields one row per logo (or a single NULL row if none)
+        if logo_filename is not None:
+            entry['logos'].append(logo_filename)
+    return cache
+
+def get_factory_cache():
+    """Return the process-wide WMI -> factory dict, loading it on first use"""
+    global _factory_cache, _wmi_pool
+    if _factory_cache is None:
+        with _factory_cache_lock:
+            if _factory_cache is None:
+                cache = _load_factory_cache()
+                _wmi_pool = tuple(cache)
+                _factory_cache = cache
+    return _factory_cache
+
+def get_wmi_pool():
+    """Return a tuple of all known factory WMIs (loads the cache if needed)"""
+    get_factory_cache()
+    return _wmi_pool
+
+def clear_factory_cache():
+    """Drop the cached reference data so the next lookup reloads it"""
+    global _factory_cache, _wmi_pool
+    with _factory_cache_lock:
+        _factory_cache = None
+        _wmi_pool = ()
+        _lookup_wmi.cache_clear()
+
+# --- END REFERENCE DATA CACHE ---
 
 # --- REGION MAPPING HELPERS ---
 
+# First VIN character (WMI Region Code) -> standard region name, based on ISO 3780.
+# Module-level and read-only so it isn't rebuilt on every call.
+WMI_REGION_MAP = types.MappingProxyType({
+    '1': 'North America', '2': 'North America', '3': 'North America',
+    '4': 'North America', '5': 'North America',
+    '6': 'Oceania', '7': 'Oceania',
+    '8': 'South America', '9': 'South America',
+    'J': 'Asia', 'K': 'Asia', 'L': 'Asia', 'M': 'Asia', 'N': 'Asia',
+    'A': 'Africa', 'B': 'Africa',
+    'S': 'Europe', 'T': 'Europe', 'U': 'Europe', 'V': 'Europe', 'W': 'Europe', 'X': 'Europe', 'Y': 'Europe', 'Z': 'Europe',
+})
+
 def map_vin_region_to_name(wmi_char):
     """Maps the first VIN character (WMI Region Code) to a standard region name."""
-    # Based on ISO 3780
-    mappings = {
-        '1': 'North America', '2': 'North America', '3': 'North America',
-        '4': 'North America', '5': 'North America',
-        '6': 'Oceania', '7': 'Oceania',
-        '8': 'South America', '9': 'South America',
-        'J': 'Asia', 'K': 'Asia', 'L': 'Asia', 'M': 'Asia', 'N': 'Asia',
-        'A': 'Africa', 'B': 'Africa',
-        'S': 'Europe', 'T': 'Europe', 'U': 'Europe', 'V': 'Europe', 'W': 'Europe', 'X': 'Europe', 'Y': 'Europe', 'Z': 'Europe',
-    }
-    return mappings.get(wmi_char.upper(), 'Unknown')
+    return WMI_REGION_MAP.get(wmi_char.upper(), 'Unknown')
 
-def get_region_image_filename(region_name):
+# Every byte except [a-z0-9_], deleted by one bytes.translate pass
+_FILENAME_CHARS = b'abcdefghijklmnopqrstuvwxyz0123456789_'
+_FILENAME_DELETE_BYTES = bytes(b for b in range(256) if b not in _FILENAME_CHARS)
+
+def _region_image_filename(region_name):
     """Converts a region name (e.g., 'North America') to a filename (e.g., 'north_america.png')."""
+    # Drop anything outside [a-z0-9_] just in case (non-ASCII via 'ignore')
+    clean_name = (
+        region_name.lower().replace(' ', '_')
+        .encode('ascii', 'ignore').translate(None, _FILENAME_DELETE_BYTES).decode('ascii')
+    )
+    return f'{clean_name}.png'
+
+# Filenames for the closed set of region names, built once at import time
+REGION_IMAGE_FILENAMES = {
+    name: _region_image_filename(name)
+    for name in ('Africa', 'Asia', 'Europe', 'North America', 'South America', 'Oceania', 'Antarctica')
+}
+
+def get_region_image_filename(region_name):
+    """Return the region image filename for a region name, or None if unknown."""
     if not region_name or region_name == 'Unknown':
         # Return a known placeholder filename if you have one, or None
-        return None 
-    
-    # Convert "North America" -> "north_america.png"
-    # Use re.sub to handle any non-alphanumeric characters just in case
-    clean_name = re.sub(r'[^a-z0-9_]+', '', region_name.lower().replace(' ', '_'))
-    return f'{clean_name}.png'
+        return None
+    filename = REGION_IMAGE_FILENAMES.get(region_name)
+    if filename is None:
+        # Region names outside the known set (free-text factory regions) are rare
+        filename = _region_image_filename(region_name)
+    return filename
 
 # --- END REGION MAPPING HELPERS ---
 
 
-def decode_vin(vin):
-    """Decode VIN using database"""
+@functools.lru_cache(maxsize=4096)
+def _lookup_wmi(wmi):
+    """
+    Resolve all WMI-scoped response fields (manufacturer, factory, region, country).
+    Cached per 3-char WMI; callers must not mutate the returned dict.
+    """
+    # General Region Info (Based on first VIN character using ISO 3780 - This is the FALLBACK/DEFAULT)
+    region = map_vin_region_to_name(wmi[0])
+
+    # Manufacturer/Factory Lookup (WMI: first 3 characters)
+    factory_entry = get_factory_cache().get(wmi)
+
+    # Main 'Country' fields; left out when the factory exists but has no Country link
+    country_fields = None
+
+    # --- FACTORY/MANUFACTURER INFO (Based on 3-char WMI) ---
+    if factory_entry:
+        manufacturer = factory_entry['name']
+        logos = factory_entry['logos']
+
+        # Determine Country/Flag for the specific Factory (WMI)
+        factory_country = factory_entry['country']
+        if factory_country:
+            # Found accurate country/region from WMI
+            factory_country_name = factory_country['common_name']
+            factory_flag = factory_country['flag_emoji']
+            factory_region = factory_country['region']
+
+            # Use the authoritative factory region for the main 'Region' display box
+            region = factory_region
+            country_fields = {
+                'country': factory_country_name,
+                'country_flag': factory_flag,
+                'country_region': factory_region,
+            }
+        else:
+            # Fallback if WmiFactory is found but not linked to a Country
+            factory_country_name = factory_entry['region'] or 'Unknown Country'
+            factory_region = factory_entry['region'] or region
+
+            # If the factory is identified by a region name, use the region image.
+            # Otherwise, default to the factory emoji.
+            factory_flag = get_region_image_filename(factory_country_name) or '🏭'
+    else:
+        # Fallback for completely unknown WMI
+        manufacturer = 'Unknown Manufacturer'
+        logos = ()
+        factory_region = 'Unknown'
+        factory_country_name = 'Unknown'
+        factory_flag = '🏳'
+
+        # Default the main 'Country' fields to the general region lookup
+        country_fields = {
+            'country': region,
+            'country_flag': '🏳', # Use placeholder, not image filename
+            'country_region': region,
+        }
+
+    fields = {
+        # Region (ISO fallback, or the factory's country region when known)
+        'region': region,
+        'region_country': region,
+        'region_flag': get_region_image_filename(region),
+
+        'manufacturer': manufacturer,
+        'manufacturer_logos': tuple(logos),
+        'factory_country': factory_country_name,
+        'factory_flag': factory_flag,
+        'factory_region': factory_region,
+    }
+    if country_fields:
+        fields.update(country_fields)
+    return fields
+
+
+def decode_vin(vin, include_check=True, check_digit=None):
+    """
+    Decode VIN using database.
+    For non-North-American VINs the check digit is informational only, so
+    include_check=False skips computing it (check_digit_valid is then None).
+    check_digit is an already computed check digit for a VIN known to be
+    well-formed (see compute_check_digits), so the scan is skipped.
+    """
     vin = vin.upper().strip()
 
-    # Basic validation
-    if len(vin) != VIN_LENGTH:
-        return {'error': f'VIN must be exactly {VIN_LENGTH} characters'}
-    for char in INVALID_CHARS:
-        if char in vin:
-            return {'error': f'Invalid character "{char}" found'}
-    if not all(c in VIN_CHARACTERS for c in vin):
+    # Basic validation + check digit in one pass (native code when Numba is
+    # available); the detailed checks below only run for invalid input to
+    # report which rule failed
+    north_american = vin[:1] in NORTH_AMERICAN_CHARS
+    if check_digit is not None:
+        valid_format, computed_check = True, check_digit
+    else:
+        valid_format, computed_check = scan_vin(vin, need_check=north_american or include_check)
+    if not valid_format:
+        if len(vin) != VIN_LENGTH:
+            return {'error': f'VIN must be exactly {VIN_LENGTH} characters'}
+        chars = set(vin)
+        if chars & INVALID_SET:
+            for char in INVALID_CHARS:
+                if char in chars:
+                    return {'error': f'Invalid character "{char}" found'}
         return {'error': 'VIN contains invalid characters'}
 
-    # Check digit validation
-    check_digit_valid = validate_check_digit(vin)
-    if is_north_american(vin) and not check_digit_valid:
-        return {'error': 'Check digit validation failed. This VIN is not valid.'}
+    # Check digit validation (mandatory for North America, optional elsewhere)
+    check_digit_valid = None
+    if north_american or include_check:
+        check_digit_valid = vin[8] == computed_check
+        if north_american and not check_digit_valid:
+            return {'error': 'Check digit validation failed. This VIN is not valid.'}
 
-    # Extract components
+    # WMI-scoped fields come from the per-WMI cache; only per-VIN parts are built here
     wmi = vin[:3]
-    region_code = vin[0]
-    
-    # 2. General Region Info (Based on first VIN character using ISO 3780 - This is the FALLBACK/DEFAULT)
-    general_region = map_vin_region_to_name(region_code)
-    
-    # Build initial result structure with ISO fallback region
+    wmi_fields = _lookup_wmi(wmi)
+
     result = {
         'vin': vin,
         'wmi': wmi,
@@ -139,113 +430,37 @@ def decode_vin(vin):
         'model_year_char': vin[9],
         'plant_code': vin[10],
         'serial_number': vin[11:17],
-        
-        # Default/Fallback Region (e.g., 'Oceania' for '7F...')
-        'region': general_region,
-        'region_country': general_region, 
-        'region_flag': get_region_image_filename(general_region)
+        **wmi_fields,
+        'manufacturer_logos': list(wmi_fields['manufacturer_logos']),
+        'model_year': resolve_model_year(vin[9]) or 'Unknown',
     }
 
-    # 1. Manufacturer/Factory Lookup (WMI: first 3 characters)
-    factory_entry = db.session.scalar(
-        select(WmiFactory).filter_by(wmi=wmi).options(joinedload(WmiFactory.country))
-    )
-    
-    # --- FACTORY/MANUFACTURER INFO (Based on 3-char WMI) ---
-    if factory_entry:
-        result['manufacturer'] = factory_entry.name 
-
-        # Determine Country/Flag for the specific Factory (WMI)
-        if factory_entry.country:
-            # Found accurate country/region from WMI
-            factory_country_name = factory_entry.country.common_name
-            factory_flag = factory_entry.country.flag_emoji
-            factory_region = factory_entry.country.region 
-            
-            # --- NEW LOGIC: OVERRIDE GENERIC REGION ---
-            # Use the authoritative factory region for the main 'Region' display box
-            result['region'] = factory_region
-            result['region_country'] = factory_region
-            result['region_flag'] = get_region_image_filename(factory_region)
-            # ------------------------------------------
-            
-            # Set the main 'Country' fields
-            result['country'] = factory_country_name
-            result['country_flag'] = factory_flag
-            result['country_region'] = factory_region
-            
-        else:
-            # Fallback if WmiFactory is found but not linked to a Country
-            factory_country_name = factory_entry.region or 'Unknown Country'
-            factory_flag = '🏭' # Placeholder
-            factory_region = factory_entry.region or result.get('region', 'Unknown Factory Region')
-            
-            # CRITICAL FIX: If the factory is identified by a region name, use the region image.
-            # Otherwise, default to the factory emoji.
-            factory_flag = get_region_image_filename(factory_country_name)
-            if not factory_flag:
-                factory_flag = '🏭'
-
-        # ASSIGN FACTORY/WMI REGION FIELDS
-        result['factory_country'] = factory_country_name
-        result['factory_flag'] = factory_flag
-        result['factory_region'] = factory_region 
-        
-        # Get manufacturer logos
-        logos = get_factory_logos(factory_id=factory_entry.id) 
-        result['manufacturer_logos'] = logos if logos else []
-        
-    else:
-        # Fallback for completely unknown WMI
-        result['manufacturer'] = 'Unknown Manufacturer'
-        result['manufacturer_logos'] = []
-        
-        # Set all factory-specific fields to Unknown
-        result['factory_region'] = 'Unknown' 
-        result['factory_country'] = 'Unknown'
-        result['factory_flag'] = '🏳'
-        
-        # Default the main 'Country' fields to the general region lookup
-        result['country'] = result.get('region_country', 'Unknown')
-        result['country_flag'] = '🏳' # Use placeholder, not image filename
-        result['country_region'] = result.get('region', 'Unknown')
-
-    # Model year
-    result['model_year'] = resolve_model_year(vin[9]) or 'Unknown'
+    # Debug trace only; %-style args so nothing is formatted unless DEBUG is on
+    if current_app.logger.isEnabledFor(logging.DEBUG):
+        current_app.logger.debug('Factory Region: %s', result['factory_region'])
     
     return result
 
 
 def generate_vin():
     """Generate a random valid VIN"""
-    # Get random factory
-    factories = db.session.scalars(select(WmiFactory)).all()
-    factory = random.choice(factories) if factories else None
-    
-    wmi = factory.wmi if factory else ''.join(random.choices(VIN_CHARACTERS, k=3))
+    # Get random factory WMI from the in-process pool (no DB traffic once loaded)
+    wmi_pool = get_wmi_pool()
+    wmi = random.choice(wmi_pool) if wmi_pool else ''.join(random.choices(VIN_CHARACTERS, k=3))
 
-    # VDS (positions 3-7)
-    vds = ''.join(random.choices(VIN_CHARACTERS, k=5))
+    # VDS (positions 3-7) and plant code in one batched RNG call
+    vds_and_plant = ''.join(random.choices(VIN_CHARACTERS, k=6))
 
     # Model year (not in future)
-    current_year = datetime.now().year
-    valid_years = [k for k, v in MODEL_YEARS.items() if resolve_model_year(k) and resolve_model_year(k) <= current_year]
+    valid_years = get_valid_year_chars()
     model_year_char = random.choice(valid_years) if valid_years else 'L' # Fallback to L (2020)
 
-    # Plant code
-    plant_code = random.choice(VIN_CHARACTERS)
-
     # Serial number (6 digits)
     serial = ''.join(random.choices(DIGITS, k=6))
 
-    # Build VIN with placeholder check digit
-    vin_array = list(wmi + vds + '0' + model_year_char + plant_code + serial)
-
-    # Compute and insert check digit
-    check_digit = compute_check_digit(''.join(vin_array))
-    vin_array[8] = check_digit
-
-    return ''.join(vin_array)
+    # Build VIN with placeholder check digit, then splice in the computed one
+    vin = f"{wmi}{vds_and_plant[:5]}0{model_year_char}{vds_and_plant[5]}{serial}"
+    return vin[:8] + compute_check_digit(vin) + vin[9:]
 
 # --- FLASK ROUTES ---
 
@@ -265,31 +480,94 @@ def factories():
 
 # --- ASSET SERVING ROUTES ---
 
+# Logo and region images are regenerated only by the seeding pipeline, so browsers
+# may keep them. Filenames are reused across re-seeds, hence a day rather than a year.
+IMAGE_MAX_AGE = 86400
+
+@bp.record_once
+def _resolve_asset_dirs(state):
+    """Resolve asset directories once when the blueprint is registered"""
+    project_root = os.path.dirname(state.app.root_path)
+    state.app.config.setdefault('LOGO_DIR', os.path.join(project_root, 'public', 'img', 'logos'))
+    state.app.config.setdefault('REGION_IMAGE_DIR', os.path.join(project_root, 'public', 'img', 'regions'))
+
+def _send_cached_image(directory, filename):
+    """send_from_directory with long-lived, immutable caching headers"""
+    # conditional=True (the default) answers If-None-Match/If-Modified-Since with 304
+    response = send_from_directory(directory, filename, max_age=IMAGE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @bp.route('/img/logos/<path:filename>')
 def serve_logo(filename):
     """Serve logos from the public/img/logos directory"""
-    project_root = os.path.dirname(current_app.root_path)
-    logo_dir = os.path.join(project_root, 'public', 'img', 'logos')
-    return send_from_directory(logo_dir, filename)
+    return _send_cached_image(current_app.config['LOGO_DIR'], filename)
 
 @bp.route('/img/regions/<path:filename>')
 def serve_region_image(filename):
     """Serve region images from the public/img/regions directory"""
-    project_root = os.path.dirname(current_app.root_path)
-    region_dir = os.path.join(project_root, 'public', 'img', 'regions')
-    return send_from_directory(region_dir, filename)
+    return _send_cached_image(current_app.config['REGION_IMAGE_DIR'], filename)
 
 
 # --- API ENDPOINTS ---
 
 @bp.route('/api/decode', methods=['POST'])
 def api_decode():
-    """API endpoint for VIN decoding"""
-    data = request.get_json()
-    vin = data.get('vin', '')
-    result = decode_vin(vin)
+    """API endpoint for VIN decoding (?fast=1 skips the non-NA check digit)"""
+    # Reject malformed requests up front, before anything touches the DB session
+    if not request.is_json:
+        return jsonify({'error': 'Request body must be JSON'}), 415
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    vin = data.get('vin') or ''
+    if not isinstance(vin, str):
+        return jsonify({'error': 'VIN must be a string'}), 400
+
+    fast = request.args.get('fast') == '1'
+    # decode_vin validates the VIN in pure Python before its factory lookup
+    result = decode_vin(vin, include_check=not fast)
+    if 'error' in result:
+        return jsonify(result), 400
     return jsonify(result)
 
+# Upper bound on VINs per batch request, keeps a single request's work bounded
+MAX_BATCH_SIZE = 1000
+
+@bp.route('/api/decode/batch', methods=['POST'])
+def api_decode_batch():
+    """API endpoint for decoding several VINs in one request ({"vins": [...]})"""
+    if not request.is_json:
+        return jsonify({'error': 'Request body must be JSON'}), 415
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    vins = data.get('vins')
+    if not isinstance(vins, list):
+        return jsonify({'error': 'vins must be a list'}), 400
+    if len(vins) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} VINs per request'}), 400
+
+    fast = request.args.get('fast') == '1'
+    # Check digits of every well-formed VIN that needs one are computed in one
+    # vectorized call up front; decode_vin then only does the lookups
+    normalized = [vin.upper().strip() if isinstance(vin, str) else None for vin in vins]
+    needs_check = [
+        vin for vin in normalized
+        if vin is not None and is_valid_vin_format(vin)
+        and (not fast or vin[0] in NORTH_AMERICAN_CHARS)
+    ]
+    check_digits = dict(zip(needs_check, compute_check_digits(needs_check)))
+    # Factory data comes from the shared in-process cache, so the whole batch
+    # costs at most the one cache load; per-VIN errors are reported in place
+    results = [
+        decode_vin(vin, include_check=not fast, check_digit=check_digits.get(vin)) if vin is not None
+        else {'error': 'VIN must be a string'}
+        for vin in normalized
+    ]
+    return jsonify({'results': results})
+
 @bp.route('/api/generate', methods=['POST'])
 def api_generate():
     """API endpoint for VIN generation"""
@@ -297,38 +575,48 @@ def api_generate():
     decoded = decode_vin(vin)
     return jsonify(decoded)
 
+@bp.route('/api/cache/clear', methods=['POST'])
+def api_clear_cache():
+    """
+    Admin endpoint to invalidate the in-memory reference data cache. Disabled
+    (404) unless CACHE_CLEAR_TOKEN is configured; callers must send that token
+    in the X-Admin-Token header, since every clear forces a full reload.
+    """
+    token = current_app.config.get('CACHE_CLEAR_TOKEN')
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    supplied = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        return jsonify({'error': 'Forbidden'}), 403
+    clear_factory_cache()
+    return jsonify({'status': 'cleared'})
+
 @bp.route('/api/factories/logos', methods=['GET'])
 def api_factories_logos():
     """API endpoint for the factory review page"""
-    query = text("""
-        SELECT 
-            wfc.id,
-            wfc.wmi,
-            wfc.name,
-            COALESCE(c.common_name, wfc.region, 'Unknown') as country,
-            GROUP_CONCAT(fl.logo_filename) as logos
-        FROM wmi_factories wfc
-        LEFT JOIN countries c ON wfc.country_id = c.id
-        LEFT JOIN factory_logos fl ON wfc.id = fl.factory_id
-        GROUP BY wfc.id
-        ORDER BY wfc.name
-    """)
-
-    result = db.session.execute(query).fetchall()
-    factories = []
+    rows = db.session.scalars(
+        select(WmiFactory)
+        .options(
+            load_only(WmiFactory.wmi, WmiFactory.name, WmiFactory.region),
+            joinedload(WmiFactory.country).load_only(Country.common_name),
+            selectinload(WmiFactory.logos).load_only(FactoryLogo.logo_filename),
+        )
+        .order_by(WmiFactory.name)
+    ).unique().all()
 
-    for row in result:
-        factory_id, wmi, manufacturer, country, logos_str = row
-        logos = logos_str.split(',') if logos_str else []
+    factories = []
+    for factory in rows:
+        logos = [logo.logo_filename for logo in factory.logos]
+        country = (factory.country.common_name if factory.country else factory.region) or 'Unknown'
 
         factories.append({
-            'id': factory_id,
-            'wmi': wmi,
-            'manufacturer': manufacturer,
+            'id': factory.id,
+            'wmi': factory.wmi,
+            'manufacturer': factory.name,
             'country': country,
-            'hasLogos': len(logos) > 0 and logos[0] != '',
-            'logoCount': len(logos) if logos_str else 0,
-            'logos': logos if logos_str else []
+            'hasLogos': bool(logos),
+            'logoCount': len(logos),
+            'logos': logos
         })
     
     return jsonify(factories)
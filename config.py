@@ -3,4 +3,6 @@
 class Config:
     """Base configuration."""
     SECRET_KEY = 'a-super-secret-key-for-development'
+    # Token for POST /api/cache/clear (sent as X-Admin-Token); the endpoint is disabled while unset
+    CACHE_CLEAR_TOKEN = None
     # Other configuration settings can go here
\ No newline at end of file
@@ -3,6 +3,10 @@ import os
 
 DB_PATH = "./instance/vin.db"
 
+def quote_identifier(name):
+    """Quote a table/column name for SQLite (identifiers can't be bound as parameters)"""
+    return '"' + name.replace('"', '""') + '"'
+
 def inspect_database():
     """Inspect and display complete database schema and sample data"""
     
@@ -12,34 +16,36 @@ def inspect_database():
     
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    # One read transaction for the whole inspection: a consistent snapshot and
+    # no per-statement transaction setup
+    cursor.execute("BEGIN")
     
     print("=" * 80)
     print("DATABASE SCHEMA INSPECTION")
     print("=" * 80)
     print()
     
-    # Get all tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-    tables = [row[0] for row in cursor.fetchall()]
+    # Get all tables along with their CREATE statements
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table' ORDER BY name")
+    table_schemas = cursor.fetchall()
+    tables = [name for name, _ in table_schemas]
     
     print(f"Found {len(tables)} table(s): {', '.join(tables)}")
     print()
     
-    for table in tables:
+    for table, schema in table_schemas:
+        quoted_table = quote_identifier(table)
         print("=" * 80)
         print(f"TABLE: {table}")
         print("=" * 80)
         
-        # Get table schema
-        cursor.execute(f"SELECT sql FROM sqlite_master WHERE type='table' AND name='{table}'")
-        schema = cursor.fetchone()[0]
         print("\nCREATE TABLE statement:")
         print("-" * 80)
         print(schema)
         print()
         
         # Get column info
-        cursor.execute(f"PRAGMA table_info({table})")
+        cursor.execute(f"PRAGMA table_info({quoted_table})")
         columns = cursor.fetchall()
         print("Columns:")
         print("-" * 80)
@@ -52,7 +58,7 @@ def inspect_database():
         print()
         
         # Get foreign keys
-        cursor.execute(f"PRAGMA foreign_key_list({table})")
+        cursor.execute(f"PRAGMA foreign_key_list({quoted_table})")
         foreign_keys = cursor.fetchall()
         if foreign_keys:
             print("Foreign Keys:")
@@ -63,16 +69,17 @@ def inspect_database():
             print()
         
         # Get row count
-        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        cursor.execute(f"SELECT COUNT(*) FROM {quoted_table}")
         row_count = cursor.fetchone()[0]
         print(f"Total rows: {row_count}")
         print()
         
         # Get sample data (first 5 rows)
         if row_count > 0:
-            cursor.execute(f"SELECT * FROM {table} LIMIT 5")
+            col_names = [col[1] for col in columns]
+            col_list = ", ".join(quote_identifier(name) for name in col_names)
+            cursor.execute(f"SELECT {col_list} FROM {quoted_table} LIMIT 5")
             rows = cursor.fetchall()
-            col_names = [description[0] for description in cursor.description]
             
             print("Sample data (first 5 rows):")
             print("-" * 80)
@@ -88,6 +95,7 @@ def inspect_database():
         
         print()
     
+    conn.commit()
     conn.close()
     
     print("=" * 80)
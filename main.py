@@ -46,6 +46,12 @@ def initialize_database(app: Flask):
         os.remove(DB_PATH)
         print(f"🗑️  Removed old database: {DB_PATH}")
 
+    # Remove any leftover WAL/shared-memory files so they aren't replayed into the new DB
+    for suffix in ('-wal', '-shm'):
+        sidecar = DB_PATH.with_name(DB_PATH.name + suffix)
+        if sidecar.exists():
+            os.remove(sidecar)
+
     # Ensure the instance directory exists
     DB_PATH.parent.mkdir(exist_ok=True)
     
@@ -1,8 +1,12 @@
 # src/fill_missing_ranges.py
 
+import itertools
 import sys
+from collections import defaultdict
 from pathlib import Path
 
+from sqlalchemy import String, column, insert, literal, select, values
+
 # Add the parent directory to the path to import 'app' and its contents
 sys.path.append(str(Path(__file__).parent.parent))
 
@@ -10,13 +14,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 from app import db
 from app.models.country import Country
 from app.models.wmi_region import WmiRegion
-
-# Valid VIN characters in order (excluding I, O, Q)
-VIN_CHARACTERS = [
-    'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'J', 'K', 'L', 'M', 
-    'N', 'P', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z',
-    '1', '2', '3', '4', '5', '6', '7', '8', '9', '0'
-]
+from vin_constants import VIN_CHARACTERS
 
 def fill_missing_wmi_ranges():
     """Fill all missing WMI region code ranges with Unknown country"""
@@ -34,16 +32,25 @@ def fill_missing_wmi_ranges():
             return
 
         # 1. Generate all possible 2-character codes
-        all_possible_codes = []
-        for first_char in VIN_CHARACTERS:
-            for second_char in VIN_CHARACTERS:
-                all_possible_codes.append(first_char + second_char)
+        all_possible_codes = set(map(''.join, itertools.product(VIN_CHARACTERS, repeat=2)))
                 
-        # 2. Get all existing codes from the WmiRegionCode table
-        existing_codes = set(code.code for code in WmiRegion.query.all())
-                
-        # 3. Find missing codes
-        missing_codes = set(all_possible_codes) - existing_codes
+        # 2-4. Insert every candidate code not already assigned in one
+        # INSERT ... SELECT, letting the database do the set difference;
+        # RETURNING hands back the inserted codes for the summary below
+        candidate_codes = values(column('code', String), name='candidate_codes').data(
+            [(code,) for code in sorted(all_possible_codes)]
+        ).cte()
+        insert_missing = (
+            insert(WmiRegion)
+            .from_select(
+                ['code', 'country_id'],
+                select(candidate_codes.c.code, literal(unknown_country.id))
+                .where(candidate_codes.c.code.not_in(select(WmiRegion.code)))
+                .order_by(candidate_codes.c.code)
+            )
+            .returning(WmiRegion.code)
+        )
+        missing_codes = db.session.scalars(insert_missing).all()
 
         if not missing_codes:
             print("✅ No missing codes found - all ranges are assigned!")
@@ -53,27 +60,14 @@ def fill_missing_wmi_ranges():
         print("💾 Assigning to 'Unknown' country...")
 
         # Group by first character for display
-        missing_by_first = {}
+        missing_by_first = defaultdict(list)
         for code in sorted(missing_codes):
-            first = code[0]
-            if first not in missing_by_first:
-                missing_by_first[first] = []
-            missing_by_first[first].append(code)
+            missing_by_first[code[0]].append(code)
 
-        inserted_count = 0
-        
-        # 4. Insert records for missing codes
         for first_char, codes in sorted(missing_by_first.items()):
             print(f"\n🔧 Filling range {first_char}: {len(codes)} codes")
-            
-            for code in codes:
-                wmi_code = WmiRegion( # <-- Use the correct model
-                    code=code,
-                    country_id=unknown_country.id
-                )
-                db.session.add(wmi_code)
-                inserted_count += 1
-                
+        inserted_count = len(missing_codes)
+
         # 5. Commit all changes
         db.session.commit()
 
@@ -1,4 +1,5 @@
 # src/import_logos.py
+import functools
 import os
 import re
 import shutil
@@ -6,8 +7,10 @@ import stat
 import subprocess
 import sys
 import json
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 from pathlib import Path
+from sqlalchemy import insert
 
 # --- Flask/SQLAlchemy Imports ---
 from app import db, create_app
@@ -30,6 +33,16 @@ BRAND_ALIASES = {
     "international trucks": ["international incomplete bus"],
 }
 
+# --- NORMALIZATION PATTERNS (compiled once) ---
+# The word 'trucks' was removed as it led to false positives when a brand name 
+# included a specific model/company name that ended in 'international'.
+BOILERPLATE_PATTERN = re.compile(
+    r'\b(ltd|limited|inc|incorporated|corp|corporation|gmbh|ag|sa|pty|llc|co|auto|cars|suv|plant|joint venture|export)\b',
+    re.IGNORECASE
+)
+DELIMITER_PATTERN = re.compile(r'[/\,&-]')
+NON_ALPHANUMERIC_PATTERN = re.compile(r'[^a-z0-9\s]')
+
 # --- UTILITY FUNCTIONS (SVG conversion, name normalization, matching) ---
 def check_svg_converter():
     """Check which SVG converter is available"""
@@ -66,6 +79,7 @@ def check_svg_converter():
         pass
     return None, converters
 
+@functools.lru_cache(maxsize=None)
 def normalize_name(name):
     """
     Normalize a name for comparison.
@@ -73,18 +87,16 @@ def normalize_name(name):
     to ensure multi-word and hyphenated brands match correctly.
     """
     # 1. Remove boilerplate words.
-    # The word 'trucks' was removed as it led to false positives when a brand name 
-    # included a specific model/company name that ended in 'international'.
-    name = re.sub(r'\b(ltd|limited|inc|incorporated|corp|corporation|gmbh|ag|sa|pty|llc|co|auto|cars|suv|plant|joint venture|export)\b', '', name, flags=re.IGNORECASE)
+    name = BOILERPLATE_PATTERN.sub('', name)
 
     name = name.lower()
 
     # 2. Replace common brand delimiters (/, &, ,) and HYPHENS (-) with a space.
     # This allows 'harley-davidson' and 'harley davidson' to both normalize to 'harley davidson'.
-    name = re.sub(r'[/\,&-]', ' ', name)
+    name = DELIMITER_PATTERN.sub(' ', name)
 
     # 3. Remove any remaining non-alphanumeric characters (except spaces)
-    name = re.sub(r'[^a-z0-9\s]', '', name)
+    name = NON_ALPHANUMERIC_PATTERN.sub('', name)
 
     # 4. Clean up multiple spaces
     name = ' '.join(name.split())
@@ -95,10 +107,17 @@ def get_logo_files():
     if not LOGOS_DIR.exists():
         print(f"Error: Logos directory not found at {LOGOS_DIR}")
         return []
+    # One directory pass, bucketed by extension (visited in SUPPORTED_FORMATS order)
+    files_by_ext = {ext: [] for ext in SUPPORTED_FORMATS}
+    with os.scandir(LOGOS_DIR) as entries:
+        for entry in entries:
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext in files_by_ext and not entry.name.startswith('.') and entry.is_file():
+                files_by_ext[ext].append(entry.name)
+
     logo_files = []
-    for ext in SUPPORTED_FORMATS:
-        for file_path in LOGOS_DIR.glob(f'*{ext}'):
-            file = file_path.name
+    for ext, files in files_by_ext.items():
+        for file in files:
             brand_name = file[:file.rfind('.')].replace('_', ' ')
             logo_normalized = normalize_name(brand_name)
             
@@ -111,6 +130,10 @@ def get_logo_files():
                 'brand_name': brand_name,
                 'normalized': logo_normalized,
                 'aliases': all_search_terms, # This list contains the primary name and all aliases
+                # Whole-word/phrase pattern per search term, compiled once per logo
+                'patterns': [
+                    re.compile(r'\b' + re.escape(term) + r'\b') for term in all_search_terms if term
+                ],
                 'extension': ext
             })
     return logo_files
@@ -128,61 +151,63 @@ def get_all_factories():
         for f_id, name in factories
     ]
 
-def find_matches(logos, factories):
+def find_match_pairs(logos, factories):
     """
-    Find matches between logos and factories.
-    Matches are found if the factory name contains the logo's primary name
-    OR any of its defined aliases, preventing duplicate matches for the same brand.
+    Return (logo_index, factory_index) pairs, testing each logo's patterns only
+    against factories whose names contain every word of one of its search terms.
     """
-    all_mappings = {}
-    match_count = 0
-    for logo in logos:
+    # Invert the factory names: word -> indexes of factories containing it
+    token_index = {}
+    for factory_index, factory in enumerate(factories):
+        for token in set(factory['normalized'].split()):
+            token_index.setdefault(token, set()).add(factory_index)
+
+    pairs = []
+    for logo_index, logo in enumerate(logos):
         # Check if the logo has any search terms (primary name + aliases)
         if not logo['aliases']:
             continue
 
-        for factory in factories:
-            factory_normalized = factory['normalized']
-            factory_matched = False
+        # Candidate factories: each term's words must all appear in the name
+        candidates = set()
+        for search_term in logo['aliases']:
+            term_tokens = search_term.split()
+            if term_tokens:
+                candidates |= set.intersection(*(token_index.get(token, set()) for token in term_tokens))
 
-            if not factory_normalized:
-                continue
+        for factory_index in sorted(candidates):
+            factory_normalized = factories[factory_index]['normalized']
             
-            # Iterate through all aliases (including the primary name itself)
-            for search_term in logo['aliases']:
-                if not search_term:
-                    continue
-                    
-                logo_words = search_term.split()
-
-                # Case 1: Single-word search term (e.g., 'ford', or 'gm')
-                if len(logo_words) == 1:
-                    # Must be exact standalone word.
-                    strict_word_pattern = re.compile(
-                        r'\b' + re.escape(search_term) + r'\b'
-                    )
-                    if re.search(strict_word_pattern, factory_normalized):
-                        factory_matched = True
-                        break # Found a match, move to adding the mapping
+            # Iterate through all aliases (including the primary name itself).
+            # Single words and multi-word phrases alike must appear as whole,
+            # contiguous words (e.g. 'ford', 'gm', 'general motors').
+            for pattern in logo['patterns']:
+                if pattern.search(factory_normalized):
+                    pairs.append((logo_index, factory_index))
+                    break # Found a match, move on to the next factory
+    return pairs
 
-                # Case 2: Multi-word search term (e.g., 'international trucks', 'general motors')
-                else:
-                    # Must check for the full, contiguous phrase surrounded by word boundaries.
-                    strict_phrase_pattern = re.compile(
-                        r'\b' + re.escape(search_term) + r'\b'
-                    )
-                    if re.search(strict_phrase_pattern, factory_normalized):
-                        factory_matched = True
-                        break # Found a match, move to adding the mapping
-
-            if factory_matched:
-                # Add the mapping only once, using the primary logo information
-                if factory['id'] not in all_mappings:
-                    all_mappings[factory['id']] = []
-                # Check for uniqueness based on the logo's primary information
-                if logo not in all_mappings[factory['id']]:
-                    all_mappings[factory['id']].append(logo)
-                    match_count += 1
+def find_matches(logos, factories):
+    """
+    Find matches between logos and factories.
+    Matches are found if the factory name contains the logo's primary name
+    OR any of its defined aliases, preventing duplicate matches for the same brand.
+    """
+    matched_pairs = find_match_pairs(logos, factories)
+
+    all_mappings = {}
+    match_count = 0
+    # Pairs come in logo-major order, as the mappings are built
+    for logo_index, factory_index in matched_pairs:
+        logo = logos[logo_index]
+        factory = factories[factory_index]
+        # Add the mapping only once, using the primary logo information
+        if factory['id'] not in all_mappings:
+            all_mappings[factory['id']] = []
+        # Check for uniqueness based on the logo's primary information
+        if logo not in all_mappings[factory['id']]:
+            all_mappings[factory['id']].append(logo)
+            match_count += 1
 
     return all_mappings, match_count
 
@@ -215,6 +240,38 @@ def convert_svg_inkscape(svg_path, png_path, height):
         print(f"  Inkscape error: {e}")
         return False
 
+def convert_svgs_inkscape_shell(jobs, height):
+    """
+    Convert many SVGs with a single `inkscape --shell` process.
+    Takes (source, dest, extension) jobs, returns one success flag per job.
+    """
+    if not jobs:
+        return []
+    commands = ''.join(
+        f'file-open:{Path(source).resolve()};export-type:png;export-height:{height};'
+        f'export-filename:{dest};export-do;file-close\n'
+        for source, dest, _ in jobs
+    )
+    try:
+        result = subprocess.run(
+            ['inkscape', '--shell'],
+            input=commands + 'quit\n', capture_output=True, text=True, timeout=30 * len(jobs)
+        )
+        if result.returncode != 0:
+            print(f"  Inkscape shell exited with code {result.returncode}: {result.stderr.strip()}")
+    except Exception as e:
+        print(f"  Inkscape shell error: {e}")
+    # Each destination is written by exactly one job, in a freshly cleaned directory.
+    # Anything the shell session didn't produce (older --shell syntax, a path it
+    # can't parse, a crash or timeout part-way) is retried on its own, as before
+    results = []
+    for source, dest, _ in jobs:
+        dest_path = Path(dest)
+        results.append(
+            dest_path.exists() or convert_svg_inkscape(Path(source).resolve(), dest_path, height)
+        )
+    return results
+
 def convert_svg_imagemagick(svg_path, png_path, height):
     """Convert SVG using ImageMagick"""
     try:
@@ -252,6 +309,13 @@ def create_thumbnail(source_path, dest_path, source_extension, svg_converter=Non
                 return False
         # Handle raster images
         with Image.open(resolved_source_path) as img:
+            # Aspect ratio from the full-size header, before draft() rounds the size
+            aspect_ratio = img.width / img.height
+            # Let libjpeg decode at a reduced DCT scale (still >= 2x the target)
+            # instead of decoding the full-resolution image just to shrink it
+            if source_extension.lower() in ('.jpg', '.jpeg'):
+                draft_height = THUMBNAIL_HEIGHT * 2
+                img.draft(img.mode, (int(draft_height * aspect_ratio), draft_height))
             if img.mode != 'RGBA':
                 if img.mode == 'RGB':
                     img = img.convert('RGBA')
@@ -261,16 +325,20 @@ def create_thumbnail(source_path, dest_path, source_extension, svg_converter=Non
                     img = img.convert('RGBA')
                 else:
                     img = img.convert('RGBA')
-            aspect_ratio = img.width / img.height
             new_height = THUMBNAIL_HEIGHT
             new_width = int(new_height * aspect_ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            # BICUBIC is visually indistinguishable from LANCZOS at 100px and cheaper
+            img = img.resize((new_width, new_height), Image.Resampling.BICUBIC)
             img.save(dest_path, 'PNG', optimize=True)
             return True
     except Exception as e:
         print(f"  Error creating thumbnail for {source_path}: {e}")
         return False
 
+def create_thumbnail_group(jobs, svg_converter=None):
+    """Create thumbnails for (source, dest, extension) jobs in order; runs in a worker process"""
+    return [create_thumbnail(source, dest, extension, svg_converter) for source, dest, extension in jobs]
+
 def handle_remove_read_only(func, path, exc_info):
     """Error handler for shutil.rmtree"""
     if func in (os.rmdir, os.remove, os.unlink):
@@ -346,6 +414,7 @@ def import_logos(app):
         print()
         print("Loading factories...")
         factories = get_all_factories()
+        factory_names_by_id = {f['id']: f['name'] for f in factories}
         print(f"Found {len(factories)} factories")
         print()
         # Find matches
@@ -357,7 +426,7 @@ def import_logos(app):
             print("\nFirst 5 factories with matches:")
             print("-" * 80)
             for factory_id, logo_list in list(final_mappings.items())[:5]:
-                factory_name = next((f['name'] for f in factories if f['id'] == factory_id), f"ID {factory_id}")
+                factory_name = factory_names_by_id.get(factory_id, f"ID {factory_id}")
                 logo_names = [logo['brand_name'] for logo in logo_list]
                 print(f"  {factory_name[:50]:50} -> {', '.join(logo_names)}")
         print()
@@ -367,59 +436,97 @@ def import_logos(app):
         thumbnail_count = 0
         skipped_count = 0
         processed_logos = set()
-        mappings_created = 0
+        # The table was just recreated, so duplicates only need tracking locally
+        seen_mappings = set()
+        logo_rows = []
         try:
+            # 1. Plan one thumbnail job per unique logo, in mapping order
+            thumbnail_jobs = []  # (source_path, dest_path, extension)
+            for logo_list in final_mappings.values():
+                for logo in logo_list:
+                    logo_filename = logo['filename']
+                    if logo_filename in processed_logos:
+                        continue
+                    processed_logos.add(logo_filename)
+                    # Skip SVG if no converter
+                    if logo['extension'] == '.svg' and not svg_converter:
+                        continue
+                    dest_path = OUTPUT_DIR / (Path(logo_filename).stem + '.png')
+                    thumbnail_jobs.append((str(LOGOS_DIR / logo_filename), str(dest_path), logo['extension']))
+
+            # 2. Resize/convert in parallel (CPU-bound and independent per file).
+            # Jobs that write the same PNG stay together, in order, so the
+            # last one still wins as it did when run serially.
+            jobs_by_dest = {}
+            for index, job in enumerate(thumbnail_jobs):
+                jobs_by_dest.setdefault(job[1], []).append(index)
+            index_groups = list(jobs_by_dest.values())
+
+            thumbnail_results = [False] * len(thumbnail_jobs)
+
+            # Inkscape: standalone SVGs go through one long-lived shell process
+            # rather than one inkscape launch per file
+            if svg_converter == 'inkscape':
+                shell_indexes = [
+                    indexes[0] for indexes in index_groups
+                    if len(indexes) == 1 and thumbnail_jobs[indexes[0]][2].lower() == '.svg'
+                ]
+                shell_results = convert_svgs_inkscape_shell(
+                    [thumbnail_jobs[i] for i in shell_indexes], THUMBNAIL_HEIGHT
+                )
+                for index, created in zip(shell_indexes, shell_results):
+                    thumbnail_results[index] = created
+                shell_index_set = set(shell_indexes)
+                index_groups = [indexes for indexes in index_groups if indexes[0] not in shell_index_set]
+
+            job_groups = [[thumbnail_jobs[i] for i in indexes] for indexes in index_groups]
+            if job_groups:
+                with ProcessPoolExecutor() as executor:
+                    group_results = executor.map(
+                        create_thumbnail_group, job_groups, [svg_converter] * len(job_groups)
+                    )
+                    for indexes, results in zip(index_groups, group_results):
+                        for index, created in zip(indexes, results):
+                            thumbnail_results[index] = created
+
+            thumbnail_count = sum(thumbnail_results)
+            skipped_count = len(processed_logos) - thumbnail_count
+
+            # 3. Build the mappings, treating a PNG as present from the point
+            # its job would have run in the serial order
+            job_results = iter(zip(thumbnail_jobs, thumbnail_results))
+            created_files = set()
+            processed_logos = set()
             for factory_id, logo_list in final_mappings.items():
                 for logo in logo_list:
                     logo_filename = logo['filename']
 
                     if logo_filename not in processed_logos:
-                        # ... (Thumbnail generation logic remains the same) ...
-                        source_path = LOGOS_DIR / logo_filename
-                        output_filename_base = Path(logo_filename).stem
-                        output_filename = output_filename_base + '.png'
-                        dest_path = OUTPUT_DIR / output_filename
-
-                        # Skip SVG if no converter
+                        processed_logos.add(logo_filename)
                         if logo['extension'] == '.svg' and not svg_converter:
-                            skipped_count += 1
-                            processed_logos.add(logo_filename)
                             continue
-                        # Generate thumbnail
-                        if create_thumbnail(str(source_path), str(dest_path), logo['extension'], svg_converter):
-                            thumbnail_count += 1
-                        else:
-                            skipped_count += 1
-
-                        processed_logos.add(logo_filename)
+                        (_, dest_path, _), created = next(job_results)
+                        if created:
+                            created_files.add(Path(dest_path).name)
 
                     # Insert mapping into database
                     output_filename = Path(logo_filename).stem + '.png'
-                    output_path = OUTPUT_DIR / output_filename
-
-                    if output_path.exists():
-                        # --- CRITICAL FIX: Check for existing mapping before inserting ---
-                        # This avoids the IntegrityError entirely by skipping duplicates.
-                        existing_mapping = db.session.scalar(
-                            db.select(FactoryLogo).filter_by(
-                                factory_id=factory_id,
-                                logo_filename=output_filename
-                            )
-                        )
-
-                        if not existing_mapping:
-                            factory_logo = FactoryLogo(
-                                factory_id=factory_id,
-                                logo_filename=output_filename
-                            )
-                            db.session.add(factory_logo)
-                            mappings_created += 1
-                        # Commit all unique objects added in the loop
+
+                    if output_filename in created_files:
+                        mapping_key = (factory_id, output_filename)
+                        if mapping_key not in seen_mappings:
+                            seen_mappings.add(mapping_key)
+                            logo_rows.append({'factory_id': factory_id, 'logo_filename': output_filename})
+
+            # Insert all unique mappings with one Core executemany (no ORM state)
+            if logo_rows:
+                db.session.execute(insert(FactoryLogo), logo_rows)
+            mappings_created = len(logo_rows)
             db.session.commit()
 
         except Exception as e:
             # Note: We must re-import `sqlalchemy.exc` to handle a specific error,
-            # but given the database is clean (recreated every run), the `db.select`
+            # but given the database is clean (recreated every run), the `seen_mappings`
             # check should make this outer except unnecessary for IntegrityErrors.
             db.session.rollback()
             raise e
@@ -1,6 +1,6 @@
 import os
 import shutil
-import stat # Required for handle_remove_read_only
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 # Removed: from PIL import Image, ImageDraw, ImageFont (No longer needed)
 
@@ -9,21 +9,20 @@ SOURCE_DIR = Path("./public_data_sources/regions")
 OUTPUT_DIR = Path("./public/img/regions")
 # Removed: IMAGE_SIZE = (50, 50)
 SUPPORTED_FORMATS = ['.png', '.jpg', '.jpeg', '.svg'] # Added SVG as it's often used for flags
-
-def handle_remove_read_only(func, path, exc_info):
-    """Error handler for shutil.rmtree on Windows read-only files"""
-    if func in (os.rmdir, os.remove, os.unlink):
-        try:
-            os.chmod(path, stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
-            func(path)
-        except Exception as e:
-            raise e
-    else:
-        # Re-raise the exception if the issue was not permissions
-        raise exc_info[1]
+SUPPORTED_FORMATS_SET = frozenset(SUPPORTED_FORMATS)
 
 # Removed: process_region_image function
 
+def copy_region_image(entry):
+    """Copy one region image (an os.DirEntry) into OUTPUT_DIR; returns None on success or the error"""
+    dest_path = os.path.join(OUTPUT_DIR, entry.name) # Preserve original filename and extension
+    try:
+        # Use shutil.copy2 to copy the file, preserving metadata (like timestamps)
+        shutil.copy2(entry.path, dest_path)
+        return None
+    except Exception as e:
+        return e
+
 def import_regions():
     print("=" * 80)
     print("REGION IMAGE IMPORTER (Direct Copy - No Resizing)")
@@ -33,43 +32,55 @@ def import_regions():
         print(f"Error: Source directory not found at {SOURCE_DIR}. Skipping region import.")
         return
 
-    # Clean output directory
-    print("Cleaning output directory...")
-    if OUTPUT_DIR.exists():
-        try:
-            shutil.rmtree(OUTPUT_DIR, onerror=handle_remove_read_only)
-            print(f"Successfully deleted {OUTPUT_DIR}")
-        except Exception as e:
-            print(f"Error deleting directory {OUTPUT_DIR}: {e}")
-            
+    # Output filenames mirror the source names, so copies simply overwrite the
+    # previous run's files; only outputs with no source left are removed below
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    print(f"Created {OUTPUT_DIR}")
+    print(f"Using output directory {OUTPUT_DIR}")
     print()
 
     print("Copying region images (preserving original quality)...")
     processed_count = 0
     skipped_count = 0
 
-    # Iterate through all files in the source directory
-    for file_path in SOURCE_DIR.iterdir():
-        if not file_path.is_file():
-            continue
-            
+    # Split the directory entries: supported files get copied, the rest are reported.
+    # os.scandir's DirEntry caches the file type, so is_file() needs no extra stat
+    with os.scandir(SOURCE_DIR) as it:
+        entries = [entry for entry in it if entry.is_file()]
+    to_copy = [entry for entry in entries if os.path.splitext(entry.name)[1].lower() in SUPPORTED_FORMATS_SET]
+
+    # Copies are I/O-bound and independent, so overlap them on a thread pool;
+    # results come back in directory order for the log below
+    copy_results = {}
+    if to_copy:
+        with ThreadPoolExecutor(max_workers=min(32, len(to_copy))) as executor:
+            copy_results = dict(zip((entry.name for entry in to_copy), executor.map(copy_region_image, to_copy)))
+
+    for entry in entries:
         # Check if the file extension is supported
-        if file_path.suffix.lower() in SUPPORTED_FORMATS:
-            dest_path = OUTPUT_DIR / file_path.name # Preserve original filename and extension
-            try:
-                # Use shutil.copy2 to copy the file, preserving metadata (like timestamps)
-                shutil.copy2(file_path, dest_path)
-                print(f"  ✅ Copied: {file_path.name}")
+        if entry.name in copy_results:
+            error = copy_results[entry.name]
+            if error is None:
+                print(f"  ✅ Copied: {entry.name}")
                 processed_count += 1
-            except Exception as e:
-                print(f"  ❌ Error copying file {file_path.name}: {e}")
+            else:
+                print(f"  ❌ Error copying file {entry.name}: {error}")
                 skipped_count += 1
         else:
-            print(f"  ⚠ Skipping unsupported file: {file_path.name}")
+            print(f"  ⚠ Skipping unsupported file: {entry.name}")
             skipped_count += 1
 
+    # Remove stale outputs left over from earlier runs: only files with no source image.
+    # A source whose copy failed this run still counts, so its previous output is kept
+    expected = {entry.name for entry in to_copy}
+    with os.scandir(OUTPUT_DIR) as it:
+        stale = [entry for entry in it if entry.is_file() and entry.name not in expected]
+    for entry in stale:
+        try:
+            os.unlink(entry.path)
+            print(f"  🗑 Removed stale file: {entry.name}")
+        except OSError as e:
+            print(f"  ❌ Error removing stale file {entry.name}: {e}")
+
     print("-" * 80)
     print(f"Total images copied: {processed_count}")
     if skipped_count > 0:
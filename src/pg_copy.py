@@ -0,0 +1,45 @@
+# src/pg_copy.py
+# PostgreSQL COPY ... FROM STDIN helpers shared by the WMI seeders
+
+import io
+from app import db
+
+# Backslash first, so the escapes added for the other characters are not doubled
+COPY_TEXT_ESCAPES = (('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r'))
+
+
+def format_copy_value(value):
+    """Format one value for PostgreSQL COPY ... FORMAT text (\\N is NULL)"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    value = str(value)
+    for char, escaped in COPY_TEXT_ESCAPES:
+        value = value.replace(char, escaped)
+    return value
+
+
+def copy_rows(table_name, columns, rows):
+    """
+    Stream rows (mappings with a value for each of columns) into table_name
+    with one COPY ... FROM STDIN on the session's connection.
+    """
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(format_copy_value(row[column]) for column in columns))
+        buf.write('\n')
+    buf.seek(0)
+
+    copy_sql = f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT text)"
+    # Raw DBAPI connection of the session's transaction, so the caller's commit covers the COPY
+    dbapi_connection = db.session.connection().connection
+    cursor = dbapi_connection.cursor()
+    try:
+        if db.engine.dialect.driver == 'psycopg':
+            with cursor.copy(copy_sql) as copy: # psycopg 3
+                copy.write(buf.getvalue())
+        else:
+            cursor.copy_expert(copy_sql, buf) # psycopg2
+    finally:
+        cursor.close()
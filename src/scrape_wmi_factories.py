@@ -1,51 +1,13 @@
-import json
-import requests
-from bs4 import BeautifulSoup
-from pathlib import Path
+# Shared page fetch/cache/parse helpers (src/ is on sys.path under main.py and when run directly)
+from wmi_common import DATA_DIR, HTML_CACHE_FILE, fetch_page_content, parse_wmi_page, write_json
 
 # Configuration
-DATA_DIR = Path("public_data_sources")
 OUTPUT_FILE = DATA_DIR / "wmi_factory_codes.json"
-HTML_CACHE_FILE = DATA_DIR / "wmi_wikipedia_page.html"
-WIKI_URL = "https://en.wikibooks.org/wiki/Vehicle_Identification_Numbers_(VIN_codes)/World_Manufacturer_Identifier_(WMI)"
-
-def fetch_page_content():
-    """Fetch the Wikipedia page content or load from cache"""
-    # Check if cached version exists
-    if HTML_CACHE_FILE.exists():
-        print(f"✓ Loading cached HTML from {HTML_CACHE_FILE}")
-        with open(HTML_CACHE_FILE, 'r', encoding='utf-8') as f:
-            return f.read()
-        
-    print(f"📥 Fetching page from {WIKI_URL}...")
-    try:
-        # Add headers to avoid 403 Forbidden
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-        }
-        response = requests.get(WIKI_URL, headers=headers, timeout=30)
-        response.raise_for_status()
-        print("✓ Page fetched successfully")
-                
-        # Cache the HTML for future use
-        DATA_DIR.mkdir(exist_ok=True)
-        with open(HTML_CACHE_FILE, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        print(f"💾 Cached HTML to {HTML_CACHE_FILE}")
-                
-        return response.text
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error fetching page: {e}")
-        raise
 
 def parse_wmi_factory_table(html_content):
     """Parse the WMI factory codes table"""
     print("\n🔍 Parsing WMI Factory Codes table...")
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = parse_wmi_page(html_content)
     
     # Find the "List of Many WMIs" section by its ID, which is more reliable
     # target_heading_element will be the <h3> tag inside the mw-heading3 div
@@ -88,10 +50,10 @@ def parse_wmi_factory_table(html_content):
                     print(f"Debug: Sibling after <p> is a <{table_check.name}> tag.")
         return []
 
-    print(f"✓ Found table with {len(table.find_all('tr'))} rows")
+    rows = table.find_all('tr')
+    print(f"✓ Found table with {len(rows)} rows")
     
     wmi_codes = []
-    rows = table.find_all('tr')
         
     # Skip header row
     data_rows = rows[1:] if len(rows) > 1 else rows
@@ -123,11 +85,8 @@ def parse_wmi_factory_table(html_content):
 
 def save_json(data, filepath):
     """Save data to JSON file"""
-    filepath.parent.mkdir(exist_ok=True)
-        
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-        print(f"💾 Saved {len(data)} codes to {filepath}")
+    write_json(data, filepath)
+    print(f"💾 Saved {len(data)} codes to {filepath}")
 
 def display_statistics(codes):
     """Display statistics about the parsed codes"""
@@ -1,66 +1,42 @@
-import json
-import requests
-from bs4 import BeautifulSoup
-from pathlib import Path
+import re
+
+# Shared page fetch/cache/parse helpers (src/ is on sys.path under main.py and when run directly)
+from wmi_common import CACHE_MAX_AGE_SECONDS, DATA_DIR, HTML_CACHE_FILE, fetch_page_content, parse_wmi_page, write_json
+from vin_constants import VIN_CHARACTERS
 
 # Configuration
-DATA_DIR = Path("public_data_sources")
 OUTPUT_FILE = DATA_DIR / "wmi_region_codes.json"
-HTML_CACHE_FILE = DATA_DIR / "wmi_wikipedia_page.html"
-WIKI_URL = "https://en.wikibooks.org/wiki/Vehicle_Identification_Numbers_(VIN_codes)/World_Manufacturer_Identifier_(WMI)"
-
-# Valid VIN characters in order (excluding I, O, Q)
-VIN_CHARACTERS = [
-    'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'J', 'K', 'L', 'M', 
-    'N', 'P', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z',
-    '1', '2', '3', '4', '5', '6', '7', '8', '9', '0'
-]
 
 # Column headers in order (second character of WMI)
 COLUMN_HEADERS = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'J', 'K', 'L', 'M', 'N', 'P', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z', '1', '2', '3', '4', '5', '6', '7', '8', '9', '0']
 
-def fetch_page_content():
-    """Fetch the Wikipedia page content or load from cache"""
-    
-    # Check if cached version exists
-    if HTML_CACHE_FILE.exists():
-        print(f"✓ Loading cached HTML from {HTML_CACHE_FILE}")
-        with open(HTML_CACHE_FILE, 'r', encoding='utf-8') as f:
-            return f.read()
-    
-    print(f"📥 Fetching page from {WIKI_URL}...")
-    try:
-        # Add headers to avoid 403 Forbidden
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-        }
-        response = requests.get(WIKI_URL, headers=headers, timeout=30)
-        response.raise_for_status()
-        print("✓ Page fetched successfully")
-        
-        # Cache the HTML for future use
-        DATA_DIR.mkdir(exist_ok=True)
-        with open(HTML_CACHE_FILE, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        print(f"💾 Cached HTML to {HTML_CACHE_FILE}")
-        
-        return response.text
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error fetching page: {e}")
-        raise
+# Position lookups for the WMI grid (row = first character, column = second)
+ROW_INDEX = {char: i for i, char in enumerate(VIN_CHARACTERS)}
+COL_INDEX = {char: i for i, char in enumerate(COLUMN_HEADERS)}
 
-def is_header_row(row):
-    """Check if a row is a header row (first cell is empty/whitespace)"""
-    cells = row.find_all(['td', 'th'])
+def extract_region_table_rows(html_content):
+    """
+    Return the WMI regions table (the second wikitable on the page) as rows of
+    (text, colspan, rowspan) cells, or None if the page has fewer tables.
+    """
+    soup = parse_wmi_page(html_content)
+    tables = soup.find_all('table', {'class': 'wikitable'})
+    if len(tables) < 2:
+        return None
+    return [
+        [
+            (cell.get_text(strip=True), int(cell.get('colspan', 1)), int(cell.get('rowspan', 1)))
+            for cell in row.find_all(['td', 'th'])
+        ]
+        for row in tables[1].find_all('tr')
+    ]
+
+def is_header_row(cells):
+    """Check if a row of (text, colspan, rowspan) cells is a header row (first cell is empty/whitespace)"""
     if not cells:
         return False
     
-    first_cell = cells[0]
-    text = first_cell.get_text(strip=True)
+    text = cells[0][0]
     
     # Header rows have empty first cell or just nbsp
     return text == '' or text == '\xa0' or text == ' '
@@ -74,63 +50,61 @@ def format_range(start_char, end_char, row_letter):
         return start
     return f"{start}-{end}"
 
+# Country spellings on the wiki page -> names used in countries.json
+COUNTRY_NAME_REPLACEMENTS = {
+    'Swaziland': 'Eswatini',
+    'UAE': 'United Arab Emirates',
+    'Dom. Rep.': 'Dominican Republic',
+    'Bosnia & Herzogovina': 'Bosnia and Herzegovina',
+}
+
+# Stray </small> tags, and everything from a <small> tag or '(' onwards
+# (e.g. "Germany (former East Germany)")
+COUNTRY_NOISE_PATTERN = re.compile(r'</small>|<small>.*|\(.*', re.DOTALL)
+
 def normalize_country_name(country):
     """Normalize country names to match countries.json"""
-    replacements = {
-        'Swaziland': 'Eswatini',
-        'UAE': 'United Arab Emirates',
-        'Dom. Rep.': 'Dominican Republic',
-        'Bosnia & Herzogovina': 'Bosnia and Herzegovina',
-    }
+    # Remove formatting like (former East Germany), <small> tags, etc. in one pass
+    country = COUNTRY_NOISE_PATTERN.sub('', country).strip()
     
-    # Remove formatting like (former East Germany), <small> tags, etc.
-    # First, clean up HTML small tags and their content
-    country = country.split('<small>')[0].strip()
-    
-    return replacements.get(country, country)
+    return COUNTRY_NAME_REPLACEMENTS.get(country, country)
 
 def parse_wmi_region_table(html_content):
     """Parse the WMI regions table by filling an array of 2-char WMI codes."""
     print("\n🔍 Parsing WMI Regions table...")
 
-    soup = BeautifulSoup(html_content, 'html.parser')
-    tables = soup.find_all('table', {'class': 'wikitable'})
+    rows = extract_region_table_rows(html_content)
 
-    if len(tables) < 2:
+    if rows is None:
         print("❌ Could not find enough tables on page")
         return []
-
-    target_table = tables[1]
     
     # 33 columns (A-Z, 1-9, 0)
     COLUMN_COUNT = len(COLUMN_HEADERS) 
     
-    # NEW: Array to hold the country name for every possible WMI code
-    # We will fill this and then merge ranges at the end.
-    wmi_map = {} 
+    # Dense grid holding the country name for every possible WMI code
+    # (None = not listed). We will fill this and then merge ranges at the end.
+    wmi_grid = [[None] * COLUMN_COUNT for _ in VIN_CHARACTERS]
     
     # Dictionary to track cells claimed by a rowspan
     # Key: col_index (0-32), Value: (country_name, remaining_rowspan, colspan)
     claimed_cells = {}
 
-    rows = target_table.find_all('tr')
-    
-    for row_index, row in enumerate(rows):
+    for row_index, cells in enumerate(rows):
         
-        if is_header_row(row):
+        if is_header_row(cells):
             continue
-
-        cells = row.find_all(['td', 'th'])
         
         # Skip rows with no content cells
         if len(cells) < 2 and not claimed_cells:
             continue
 
         # First cell is the row letter (A, B, C, etc.)
-        row_letter = cells[0].get_text(strip=True) if cells else None
+        row_letter = cells[0][0] if cells else None
 
         if not row_letter or len(row_letter) > 1:
             continue
+        grid_row = wmi_grid[ROW_INDEX[row_letter]] if row_letter in ROW_INDEX else None
 
         # --- PHASE 1: Populate current row's countries, handling rowspans ---
         col_cursor = 0
@@ -153,11 +127,7 @@ def parse_wmi_region_table(html_content):
                 
             # 2. If the column is NOT claimed, read the next actual cell in the current row
             elif cell_cursor < len(cells):
-                cell = cells[cell_cursor]
-                
-                colspan = int(cell.get('colspan', 1))
-                rowspan = int(cell.get('rowspan', 1))
-                country = cell.get_text(strip=True)
+                country, colspan, rowspan = cells[cell_cursor]
                 
                 # If this cell spans multiple rows, add it to claimed_cells
                 if rowspan > 1:
@@ -170,13 +140,11 @@ def parse_wmi_region_table(html_content):
             # 3. If a country was determined (either claimed or from a new cell)
             if country:
                 country = normalize_country_name(country)
-                country = country.replace('<small>', '').replace('</small>', '')
-                country = country.split('(')[0].strip()
 
                 # Fill all the spanned WMI codes for this entry
-                for i in range(col_cursor, col_cursor + colspan):
-                    wmi_code = row_letter + COLUMN_HEADERS[i]
-                    wmi_map[wmi_code] = country
+                if grid_row is not None:
+                    for i in range(col_cursor, col_cursor + colspan):
+                        grid_row[i] = country
             
             # Move column cursor forward
             col_cursor += colspan
@@ -187,56 +155,38 @@ def parse_wmi_region_table(html_content):
             k: v for k, v in new_claimed_cells.items() if v[1] > 0
         }
 
-    # --- PHASE 3: Convert the wmi_map (code: country) into grouped ranges ---
+    # --- PHASE 3: Convert the wmi_grid into grouped ranges ---
     print("\n✓ Consolidating codes into ranges...")
     
     wmi_rules = []
-    current_country = None
-    current_range_start = None
     
-    # Iterate through all possible codes in order
-    all_rows = [c[0] for c in wmi_map.keys()]
-    unique_rows = sorted(list(set(all_rows)), key=lambda x: VIN_CHARACTERS.index(x))
-    
-    for row in unique_rows:
-        codes_in_row = sorted([k for k in wmi_map.keys() if k.startswith(row)], 
-                              key=lambda x: COLUMN_HEADERS.index(x[1]))
-                              
+    # Walk every row in order, merging runs of listed codes with the same country.
+    # Unlisted codes don't break a run: a range ends just before the next country.
+    for row, grid_row in zip(VIN_CHARACTERS, wmi_grid):
         current_country = None
         current_range_start = None
+        last_col = None
         
-        for code in codes_in_row:
-            country = wmi_map.get(code)
+        for col, country in enumerate(grid_row):
+            if country is None:
+                continue
             
             # If the country changes (or this is the first code in the row)
             if country != current_country:
-                # 1. Finalize the previous range (if one exists)
-                if current_country and current_range_start:
-                    range_str = format_range(
-                        current_range_start[1], # start_char
-                        code[1],               # end_char (The code BEFORE the new one)
-                        row                    # row_letter
-                    )
-                    # Correct the end_char to be the one *before* the current code
-                    prev_char_index = COLUMN_HEADERS.index(code[1]) - 1
-                    if prev_char_index >= 0:
-                         range_str = format_range(current_range_start[1], COLUMN_HEADERS[prev_char_index], row)
-                    
+                # 1. Finalize the previous range (it ends at the column before this one)
+                if current_country and current_range_start is not None:
+                    range_str = format_range(COLUMN_HEADERS[current_range_start], COLUMN_HEADERS[col - 1], row)
                     wmi_rules.append({"range": range_str, "country": current_country})
                     
                 # 2. Start a new range
                 current_country = country
-                current_range_start = code
-                
-            # If this is the last code in the row, finalize the range
-            if code == codes_in_row[-1]:
-                 if current_country and current_range_start:
-                    range_str = format_range(
-                        current_range_start[1], # start_char
-                        code[1],               # end_char
-                        row                    # row_letter
-                    )
-                    wmi_rules.append({"range": range_str, "country": current_country})
+                current_range_start = col
+            last_col = col
+        
+        # Finalize the range that runs to the last listed code in the row
+        if current_country and current_range_start is not None:
+            range_str = format_range(COLUMN_HEADERS[current_range_start], COLUMN_HEADERS[last_col], row)
+            wmi_rules.append({"range": range_str, "country": current_country})
 
 
     print(f"✓ Extracted {len(wmi_rules)} WMI region mappings")
@@ -244,10 +194,7 @@ def parse_wmi_region_table(html_content):
 
 def save_json(data, filepath):
     """Save data to JSON file"""
-    filepath.parent.mkdir(exist_ok=True)
-    
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    write_json(data, filepath)
     
     print(f"💾 Saved {len(data)} rules to {filepath}")
 
@@ -295,7 +242,7 @@ def main():
         print("\n✅ WMI region codes extracted successfully!")
         print(f"\n💡 Tip: The HTML page is cached at {HTML_CACHE_FILE}")
         print("   You can reuse it for other scraping tasks without making new requests.")
-        print("   Delete the cache file if you want to fetch a fresh copy.")
+        print(f"   After {CACHE_MAX_AGE_SECONDS // 60} minutes it is revalidated with a conditional GET and refreshed if the page changed.")
         
     except Exception as e:
         print(f"\n❌ Error: {e}")
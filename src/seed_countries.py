@@ -1,16 +1,32 @@
 import os
 import json
 import requests
+import tempfile
+import time
 from pathlib import Path
 from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 # ASSUMED IMPORTS: Import the SQLAlchemy db object and the Country model
 from app import db 
 from app.models.country import Country 
 
+# Optional: faster (Rust) JSON parser; falls back to the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configuration
 DATA_DIR = Path("public_data_sources")
 COUNTRIES_FILE = DATA_DIR / "countries.json"
 COUNTRIES_URL = "https://raw.githubusercontent.com/mledoze/countries/master/countries.json"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# ETag/Last-Modified of the downloaded file, for conditional re-downloads
+COUNTRIES_HEADERS_FILE = COUNTRIES_FILE.with_suffix('.headers.json')
+# Don't revalidate a downloaded file younger than this
+CACHE_MAX_AGE_SECONDS = 24 * 3600
 
 # Helper functions (kept identical)
 def get_first_value(dict_obj):
@@ -31,6 +47,18 @@ def get_calling_code(idd_obj):
         return f"{root}{suffixes[0]}"
     return root if root else None
 
+# 'North America' subregion (used by US) is included so the United States maps correctly
+NORTH_AMERICA_SUBREGIONS = frozenset({'Northern America', 'Central America', 'Caribbean', 'North America'})
+
+# Regions that map to a fixed name ('Americas' is split by subregion in map_region)
+REGION_MAPPING = {
+    'Africa': 'Africa',
+    'Asia': 'Asia',
+    'Europe': 'Europe',
+    'Oceania': 'Oceania',
+    'Antarctic': 'Antarctica'
+}
+
 def map_region(region, subregion):
     """
     Map region names to standardized values.
@@ -38,36 +66,90 @@ def map_region(region, subregion):
     FIXED: Added 'North America' to the subregion check list to correctly
     classify the United States.
     """
-    region_mapping = {
-        'Africa': 'Africa',
-        # --- FIX APPLIED HERE ---
-        # 'North America' subregion (used by US) is now correctly mapped.
-        'Americas': 'North America' if subregion in ['Northern America', 'Central America', 'Caribbean', 'North America'] else 'South America',
-        'Asia': 'Asia',
-        'Europe': 'Europe',
-        'Oceania': 'Oceania',
-        'Antarctic': 'Antarctica'
-    }
-    return region_mapping.get(region, region)
+    if region == 'Americas':
+        return 'North America' if subregion in NORTH_AMERICA_SUBREGIONS else 'South America'
+    return REGION_MAPPING.get(region, region)
+
+def load_cache_validators():
+    """Conditional-request headers (If-None-Match / If-Modified-Since) saved with the countries file"""
+    if not COUNTRIES_HEADERS_FILE.exists():
+        return {}
+    with open(COUNTRIES_HEADERS_FILE, 'r', encoding='utf-8') as f:
+        saved = json.load(f)
+    validators = {}
+    if saved.get('ETag'):
+        validators['If-None-Match'] = saved['ETag']
+    if saved.get('Last-Modified'):
+        validators['If-Modified-Since'] = saved['Last-Modified']
+    return validators
+
+def read_countries_file():
+    """Parse the saved countries file"""
+    with open(COUNTRIES_FILE, 'rb') as f:
+        return orjson.loads(f.read()) if orjson is not None else json.load(f)
+
+def save_countries_response(response):
+    """
+    Stream the response body to COUNTRIES_FILE and remember its validators.
+    The body goes to a temp file that only replaces COUNTRIES_FILE once
+    complete, so a failed download leaves the previous copy intact.
+    """
+    # Raw bytes straight to disk instead of parsing and re-serializing them
+    with tempfile.NamedTemporaryFile('wb', dir=DATA_DIR, suffix='.tmp', delete=False) as f:
+        temp_path = f.name
+        try:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.unlink(temp_path)
+            raise
+    os.replace(temp_path, COUNTRIES_FILE)
+    # Validators only once the file they describe is in place
+    with open(COUNTRIES_HEADERS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            'ETag': response.headers.get('ETag'),
+            'Last-Modified': response.headers.get('Last-Modified'),
+        }, f, indent=2)
 
 def download_countries():
-    """Download countries.json if it doesn't exist"""
+    """Download countries.json if it doesn't exist (or changed upstream since the last download)"""
     DATA_DIR.mkdir(exist_ok=True)
         
     if COUNTRIES_FILE.exists():
-        print(f"✓ Countries file already exists: {COUNTRIES_FILE}")
-        with open(COUNTRIES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        validators = load_cache_validators()
+        cache_age = time.time() - COUNTRIES_FILE.stat().st_mtime
+
+        # Use the file as-is if it is fresh, or if we have nothing to revalidate with
+        if not validators or cache_age < CACHE_MAX_AGE_SECONDS:
+            print(f"✓ Countries file already exists: {COUNTRIES_FILE}")
+            return read_countries_file()
+
+        # Otherwise ask the server whether the file changed (conditional GET)
+        print(f"🔄 Revalidating {COUNTRIES_FILE} against {COUNTRIES_URL}...")
+        try:
+            with requests.get(COUNTRIES_URL, headers=validators, timeout=30, stream=True) as response:
+                if response.status_code == 304:
+                    print(f"✓ Countries file is up to date: {COUNTRIES_FILE}")
+                    COUNTRIES_FILE.touch() # Restart the max-age window
+                    return read_countries_file()
+                response.raise_for_status()
+                save_countries_response(response)
+            countries = read_countries_file()
+            print(f"✓ Downloaded and saved {len(countries)} countries to {COUNTRIES_FILE}")
+            return countries
+        except requests.exceptions.RequestException as e:
+            print(f"⚠ Could not revalidate ({e}), using {COUNTRIES_FILE}")
+            return read_countries_file()
             
     print(f"📥 Downloading countries data from {COUNTRIES_URL}...")
     try:
-        response = requests.get(COUNTRIES_URL, timeout=30)
-        response.raise_for_status()
-        countries = response.json()
-                
-        # Save to file
-        with open(COUNTRIES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(countries, f, indent=2, ensure_ascii=False)
+        with requests.get(COUNTRIES_URL, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            save_countries_response(response)
+
+        # Parse the saved copy once for the return value
+        countries = read_countries_file()
                 
         print(f"✓ Downloaded and saved {len(countries)} countries to {COUNTRIES_FILE}")
         return countries
@@ -83,16 +165,22 @@ def seed_countries(countries_data):
     inserted_count = 0
     skipped_count = 0
     updated_count = 0
+    # New rows go in as one executemany; progress lines are printed in one go
+    rows_to_insert = []
+    log_lines = []
 
-    # Use a set for faster lookup of existing ISO alpha-2 codes
-    # Fetch all existing countries to determine if we insert or skip/update
-    existing_countries = {c.iso_alpha2: c for c in Country.query.all()}
+    # Fetch just the ISO alpha-2 code and region of existing countries to decide
+    # between insert and skip/update (no ORM objects needed for that)
+    existing_countries = {
+        row.iso_alpha2: row.region
+        for row in db.session.execute(select(Country.iso_alpha2, Country.region))
+    }
         
     try:
         for country_data in countries_data:
             iso_alpha2 = country_data.get('cca2')
             if not iso_alpha2:
-                print(f"⚠ Skipping country without ISO Alpha-2 code")
+                log_lines.append("⚠ Skipping country without ISO Alpha-2 code")
                 skipped_count += 1
                 continue
 
@@ -104,51 +192,67 @@ def seed_countries(countries_data):
 
             # Check if country already exists
             if iso_alpha2 in existing_countries:
-                country = existing_countries[iso_alpha2]
-                
                 # Special check for US: force region update if needed
-                if iso_alpha2 == 'US' and country.region != region:
-                    country.region = region
-                    db.session.add(country)
-                    print(f"  ⬆ Updated region for {common_name} to {region} (FIXED)")
+                if iso_alpha2 == 'US' and existing_countries[iso_alpha2] != region:
+                    db.session.execute(
+                        update(Country).where(Country.iso_alpha2 == iso_alpha2).values(region=region)
+                    )
+                    log_lines.append(f"  ⬆ Updated region for {common_name} to {region} (FIXED)")
                     updated_count += 1
                 else:
                     skipped_count += 1
                 continue
 
             # If country does not exist, insert it
-            country = Country(
-                iso_alpha2=iso_alpha2,
-                iso_alpha3=country_data.get('cca3'),
-                iso_numeric=country_data.get('ccn3'),
-                name=official_name,
-                common_name=common_name,
-                region=region, # Uses the fixed region mapping
-                subregion=country_data.get('subregion'),
-                currency_code=get_first_value(country_data.get('currencies')),
-                calling_code=get_calling_code(country_data.get('idd', {})),
-                tld=country_data.get('tld', [None])[0],
-                flag_emoji=country_data.get('flag'),
-            )
-            db.session.add(country)
-            print(f"  ✓ {common_name}")
+            rows_to_insert.append({
+                'iso_alpha2': iso_alpha2,
+                'iso_alpha3': country_data.get('cca3'),
+                'iso_numeric': country_data.get('ccn3'),
+                'name': official_name,
+                'common_name': common_name,
+                'region': region, # Uses the fixed region mapping
+                'subregion': country_data.get('subregion'),
+                'currency_code': get_first_value(country_data.get('currencies')),
+                'calling_code': get_calling_code(country_data.get('idd', {})),
+                'tld': country_data.get('tld', [None])[0],
+                'flag_emoji': country_data.get('flag'),
+            })
+            log_lines.append(f"  ✓ {common_name}")
             inserted_count += 1
             
         # Add special "Unknown" country for unassigned/invalid VIN ranges
         if 'XX' not in existing_countries:
-            unknown_country = Country(
-                iso_alpha2='XX', 
-                iso_alpha3='XXX', 
-                iso_numeric='999', 
-                name='Unknown', 
-                common_name='Unknown',
-                region='Unknown', 
-                subregion='Unknown', 
-                flag_emoji='🏳', 
-            )
-            db.session.add(unknown_country)
-            print(f"  ✓ Unknown (special catch-all country)")
+            rows_to_insert.append({
+                'iso_alpha2': 'XX', 
+                'iso_alpha3': 'XXX', 
+                'iso_numeric': '999', 
+                'name': 'Unknown', 
+                'common_name': 'Unknown',
+                'region': 'Unknown', 
+                'subregion': 'Unknown', 
+                'currency_code': None,
+                'calling_code': None,
+                'tld': None,
+                'flag_emoji': '🏳', 
+            })
+            log_lines.append("  ✓ Unknown (special catch-all country)")
             inserted_count += 1
+
+        if log_lines:
+            print("\n".join(log_lines))
+
+        # Every row carries the same keys, so this is a single executemany.
+        # ON CONFLICT DO NOTHING (PostgreSQL / SQLite) lets the unique iso_alpha2
+        # index drop rows another seeder inserted after the snapshot above.
+        if rows_to_insert:
+            dialect_name = db.engine.dialect.name
+            if dialect_name == 'postgresql':
+                stmt = pg_insert(Country).on_conflict_do_nothing(index_elements=['iso_alpha2'])
+            elif dialect_name == 'sqlite':
+                stmt = sqlite_insert(Country).on_conflict_do_nothing(index_elements=['iso_alpha2'])
+            else:
+                stmt = insert(Country)
+            db.session.execute(stmt, rows_to_insert)
             
         db.session.commit()
                 
@@ -0,0 +1,15 @@
+# src/vin_constants.py
+# VIN alphabet and region names shared by the WMI scrapers and seeders
+
+# Valid VIN characters in order (excluding I, O, Q)
+VIN_CHARACTERS = (
+    'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'J', 'K', 'L', 'M',
+    'N', 'P', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z',
+    '1', '2', '3', '4', '5', '6', '7', '8', '9', '0'
+)
+
+# Position of each VIN character, for O(1) range lookups
+VIN_CHAR_INDEX = {char: i for i, char in enumerate(VIN_CHARACTERS)}
+
+# Known regions (used where a WMI maps to a continent rather than a country)
+KNOWN_REGIONS = frozenset({'Africa', 'Asia', 'Europe', 'North America', 'South America', 'Oceania', 'Antarctica'})
@@ -0,0 +1,138 @@
+# src/wmi_common.py
+# Fetching, caching and parsing of the Wikibooks WMI page, shared by
+# scrape_wmi_regions.py and scrape_wmi_factories.py
+
+import functools
+import json
+import os
+import requests
+import tempfile
+import time
+from bs4 import BeautifulSoup
+from pathlib import Path
+
+# Optional: Rust-backed JSON encoder for the scraped output files
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configuration
+DATA_DIR = Path("public_data_sources")
+HTML_CACHE_FILE = DATA_DIR / "wmi_wikipedia_page.html"
+HTML_HEADERS_FILE = HTML_CACHE_FILE.with_suffix('.headers.json')
+# Don't revalidate a cached page younger than this
+CACHE_MAX_AGE_SECONDS = 3600
+# Chunk size for streaming the page to disk
+COPY_BUFFER_SIZE = 128 * 1024
+WIKI_URL = "https://en.wikibooks.org/wiki/Vehicle_Identification_Numbers_(VIN_codes)/World_Manufacturer_Identifier_(WMI)"
+
+def load_cache_validators():
+    """Conditional-request headers (If-None-Match / If-Modified-Since) saved with the cached page"""
+    if not HTML_HEADERS_FILE.exists():
+        return {}
+    with open(HTML_HEADERS_FILE, 'r', encoding='utf-8') as f:
+        saved = json.load(f)
+    validators = {}
+    if saved.get('ETag'):
+        validators['If-None-Match'] = saved['ETag']
+    if saved.get('Last-Modified'):
+        validators['If-Modified-Since'] = saved['Last-Modified']
+    return validators
+
+def read_cached_page():
+    """Read the cached HTML page"""
+    with open(HTML_CACHE_FILE, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def fetch_page_content():
+    """Fetch the Wikipedia page content or load from cache"""
+    # Add headers to avoid 403 Forbidden
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+    }
+
+    # Check if cached version exists
+    if HTML_CACHE_FILE.exists():
+        validators = load_cache_validators()
+        cache_age = time.time() - HTML_CACHE_FILE.stat().st_mtime
+
+        # Use the cache as-is if it is fresh, or if we have nothing to revalidate with
+        if not validators or cache_age < CACHE_MAX_AGE_SECONDS:
+            print(f"✓ Loading cached HTML from {HTML_CACHE_FILE}")
+            return read_cached_page()
+
+        # Otherwise ask the server whether the page changed (conditional GET)
+        print(f"🔄 Revalidating cached HTML against {WIKI_URL}...")
+        try:
+            with requests.get(WIKI_URL, headers={**headers, **validators}, timeout=30, stream=True) as response:
+                if response.status_code == 304:
+                    print(f"✓ Cache is up to date, loading {HTML_CACHE_FILE}")
+                    HTML_CACHE_FILE.touch() # Restart the max-age window
+                    return read_cached_page()
+                response.raise_for_status()
+                print("✓ Page changed, fetched new copy")
+                return cache_response(response)
+        except requests.exceptions.RequestException as e:
+            print(f"⚠ Could not revalidate ({e}), using cached HTML")
+            return read_cached_page()
+    
+    print(f"📥 Fetching page from {WIKI_URL}...")
+    try:
+        with requests.get(WIKI_URL, headers=headers, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            print("✓ Page fetched successfully")
+            return cache_response(response)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Error fetching page: {e}")
+        raise
+
+def cache_response(response):
+    """
+    Stream the fetched HTML to the cache file, plus its validators for later
+    conditional requests. The body goes to a temp file that only replaces the
+    cache once complete, so a failed transfer leaves the previous copy intact.
+    """
+    DATA_DIR.mkdir(exist_ok=True)
+    # iter_content undoes gzip/deflate and reports transfer errors as RequestException,
+    # so fetch_page_content's fallback to the cached copy still applies
+    with tempfile.NamedTemporaryFile('wb', dir=DATA_DIR, suffix='.tmp', delete=False) as f:
+        temp_path = f.name
+        try:
+            for chunk in response.iter_content(COPY_BUFFER_SIZE):
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.unlink(temp_path)
+            raise
+    os.replace(temp_path, HTML_CACHE_FILE)
+    # Validators only once the page they describe is in place
+    with open(HTML_HEADERS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            'ETag': response.headers.get('ETag'),
+            'Last-Modified': response.headers.get('Last-Modified'),
+        }, f, indent=2)
+    print(f"💾 Cached HTML to {HTML_CACHE_FILE}")
+    
+    return read_cached_page()
+
+def write_json(data, filepath):
+    """Write data as indented UTF-8 JSON (orjson when available, else stdlib json)"""
+    filepath.parent.mkdir(exist_ok=True)
+    if orjson is not None:
+        filepath.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+@functools.lru_cache(maxsize=1)
+def parse_wmi_page(html_content):
+    """
+    Parse the WMI page once per process (BeautifulSoup over lxml). Both
+    scrapers read the same page, so the second one gets the already-parsed soup.
+    """
+    return BeautifulSoup(html_content, 'lxml')
@@ -1,25 +1,43 @@
 # src/wmi_factory_code_seeder.py
 
+import functools
 import json
 import re
 from pathlib import Path
+from sqlalchemy import insert, update
+from sqlalchemy.orm import joinedload
 from app import db # Import the SQLAlchemy db object
 from app.models.country import Country
 from app.models.wmi_factory import WmiFactory
 from app.models.wmi_region import WmiRegion
+from pg_copy import copy_rows
+from vin_constants import KNOWN_REGIONS, VIN_CHAR_INDEX, VIN_CHARACTERS
+
+# Optional: faster (Rust) JSON parser; falls back to the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Configuration
 FACTORY_DATA_FILE = Path("public_data_sources") / "wmi_factory_codes.json"
 
-# Valid VIN characters in order (excluding I, O, Q)
-VIN_CHARACTERS = [
-    'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'J', 'K', 'L', 'M', 
-    'N', 'P', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z',
-    '1', '2', '3', '4', '5', '6', '7', '8', '9', '0'
-]
+# A 3-character range such as '1A4-1A8' (prefix match, as before)
+WMI_RANGE_PATTERN = re.compile(r'[A-Z0-9]{3}-[A-Z0-9]{3}')
+
+# Columns streamed by COPY, in order (is_active is spelled out since COPY skips Python-side defaults)
+FACTORY_COPY_COLUMNS = ('wmi', 'name', 'country_id', 'region', 'is_active')
+
+def insert_factories(rows):
+    """
+    Insert new factory rows: streamed through COPY on PostgreSQL (one write
+    instead of thousands of executemany rounds), a Core executemany elsewhere.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        db.session.execute(insert(WmiFactory), rows)
+        return
 
-# List of known regions for lookups
-KNOWN_REGIONS = ['Africa', 'Asia', 'Europe', 'North America', 'South America', 'Oceania', 'Antarctica']
+    copy_rows(WmiFactory.__tablename__, FACTORY_COPY_COLUMNS, ({**row, 'is_active': True} for row in rows))
 
 
 def expand_wmi_range(range_str):
@@ -43,12 +61,12 @@ def expand_wmi_range(range_str):
             end_third = end[2]
             
             try:
-                start_idx = VIN_CHARACTERS.index(start_third)
-                end_idx = VIN_CHARACTERS.index(end_third)
+                start_idx = VIN_CHAR_INDEX[start_third]
+                end_idx = VIN_CHAR_INDEX[end_third]
                 
                 for i in range(start_idx, end_idx + 1):
                     codes.append(prefix + VIN_CHARACTERS[i])
-            except ValueError:
+            except KeyError:
                 # Should not happen if data is clean
                 print(f"⚠ Invalid character in range '{range_str}'")
         else:
@@ -62,6 +80,34 @@ def expand_wmi_range(range_str):
     return codes
 
 
+@functools.lru_cache(maxsize=None)
+def expand_wmi_block(prefix):
+    """
+    Expand a 2-character block into its 33 codes (e.g. 'KL' -> 'KLA'..'KL0').
+    The dataset only has a handful of distinct blocks, so each is built once.
+    """
+    return tuple(prefix + char for char in VIN_CHARACTERS)
+
+
+@functools.lru_cache(maxsize=None)
+def expand_wmi_part(part):
+    """
+    Expand one token of a WMI cell into a tuple of 3-character codes, or None
+    if it is not a recognised format. Tokens repeat across entries, so each
+    distinct one is expanded once (range warnings print on first sight only).
+    """
+    if len(part) == 3:
+        # Case: Single 3-character code (e.g., '1A4')
+        return (part,)
+    if WMI_RANGE_PATTERN.match(part):
+        # Case: Standard 3-character range (e.g., '1A4-1A8')
+        return tuple(expand_wmi_range(part))
+    if len(part) == 2:
+        # ⭐ NEW LOGIC: Handle 2-Character Block (e.g., 'KL' -> 'KLA-KL0')
+        return expand_wmi_block(part)
+    return None
+
+
 def parse_complex_wmi(wmi_str):
     """
     Parse complex WMI strings with multiple ranges and codes.
@@ -90,8 +136,8 @@ def seed_wmi_factory_codes():
         return
 
     try:
-        with open(FACTORY_DATA_FILE, "r", encoding="utf-8") as f:
-            factory_data = json.load(f)
+        with open(FACTORY_DATA_FILE, 'rb') as f:
+            factory_data = orjson.loads(f.read()) if orjson is not None else json.load(f)
 
         print("✓ Loaded WMI factory codes data")
         print("💾 Processing and inserting into database...")
@@ -100,6 +146,23 @@ def seed_wmi_factory_codes():
         updated_count = 0
         skipped_count = 0
         errors = []
+        # Per-code status lines, printed in one write once the batch is committed
+        log_lines = []
+        # New factory rows keyed by WMI, inserted in one batch after the loop;
+        # later entries for the same WMI merge into the pending row
+        new_factories = {}
+        new_factory_locations = {}
+
+        # Load both lookup tables once (countries eagerly, for the display names)
+        # instead of two SELECTs per expanded WMI code
+        region_index = {
+            r.code: r for r in WmiRegion.query.options(joinedload(WmiRegion.country)).all()
+        }
+        existing_wmis = {
+            w.wmi: w for w in WmiFactory.query.options(joinedload(WmiFactory.country)).all()
+        }
+        # Merged names for stored factories, written in one bulk UPDATE after the loop
+        merged_names = {}
 
         for entry in factory_data:
             wmi_raw = entry.get('WMI', '').strip()
@@ -112,29 +175,18 @@ def seed_wmi_factory_codes():
                 continue
 
             # --- WMI Parsing Logic ---
-            wmi_codes = []
-            
             # Normalize common complex separators: convert spaces and forward slashes to commas for simpler handling
             wmi_normalized = wmi_raw.replace(' ', ',').replace('/', ',')
             
             # Split by comma (handles the original comma, and the new space/slash separators)
             parts = [p.strip() for p in wmi_normalized.split(',') if p.strip()]
 
-            for part in parts:
-                if len(part) == 3:
-                    # Case: Single 3-character code (e.g., '1A4')
-                    wmi_codes.append(part)
-                elif re.match(r'[A-Z0-9]{3}-[A-Z0-9]{3}', part):
-                    # Case: Standard 3-character range (e.g., '1A4-1A8')
-                    wmi_codes.extend(expand_wmi_range(part))
-                elif len(part) == 2:
-                    # ⭐ NEW LOGIC: Handle 2-Character Block (e.g., 'KL' -> 'KLA-KL0')
-                    prefix = part
-                    range_str = f"{prefix}{VIN_CHARACTERS[0]}-{prefix}{VIN_CHARACTERS[-1]}"
-                    wmi_codes.extend(expand_wmi_range(range_str))
-                else:
+            expansions = [expand_wmi_part(part) for part in parts]
+            for codes in expansions:
+                if codes is None:
                     error_msg = f"⚠ Invalid WMI format (not 2 or 3 chars, not a range): '{wmi_raw}'"
                     errors.append(error_msg)
+            wmi_codes = [code for codes in expansions if codes for code in codes]
                     
             if not wmi_codes:
                 # Only report error if the original raw string wasn't empty and failed to produce codes
@@ -153,7 +205,7 @@ def seed_wmi_factory_codes():
                 region_code = wmi[:2]
 
                 # Find the country/region entry using the WmiRegionCode lookup
-                wmi_region_entry = WmiRegion.query.filter_by(code=region_code).first()
+                wmi_region_entry = region_index.get(region_code)
 
                 country_id = None
                 region_name = None
@@ -169,39 +221,63 @@ def seed_wmi_factory_codes():
                     else:
                         country_id = country_obj.id # Link the manufacturer to the Country record
 
+                # A WMI first seen earlier in this run: merge into the pending row
+                pending = new_factories.get(wmi)
+                if pending:
+                    if manufacturer not in pending['name']:
+                        pending['name'] = f"{pending['name']} & {manufacturer}"
+                        log_lines.append(f"  ⟳ Updated {wmi} -> {pending['name'][:50]}... ({new_factory_locations[wmi]})")
+                        updated_count += 1
+                    else:
+                        skipped_count += 1
+                    continue
+
                 # Check if this WMI already exists (Manufacturer.wmi is unique)
-                existing = WmiFactory.query.filter_by(wmi=wmi).first()
+                existing = existing_wmis.get(wmi)
 
                 if existing:
                     # MERGE LOGIC: Combine manufacturer names if they differ
-                    if manufacturer not in existing.name:
-                        existing.name = f"{existing.name} & {manufacturer}"
-                        db.session.add(existing)
+                    current_name = merged_names.get(wmi, existing.name)
+                    if manufacturer not in current_name:
+                        merged_names[wmi] = current_name = f"{current_name} & {manufacturer}"
                         location = existing.country.common_name if existing.country else existing.region or "Unknown"
-                        print(f"  ⟳ Updated {wmi} -> {existing.name[:50]}... ({location})")
+                        log_lines.append(f"  ⟳ Updated {wmi} -> {current_name[:50]}... ({location})")
                         updated_count += 1
                     else:
                         skipped_count += 1
                     continue
 
-                # Create new Manufacturer record
-                factory_code = WmiFactory(
-                    wmi=wmi,
-                    name=manufacturer,
-                    country_id=country_id, # Foreign key to Country
-                    region=region_name # String name of the region
-                )
-
-                db.session.add(factory_code)
+                # Queue new Manufacturer record
+                new_factories[wmi] = {
+                    'wmi': wmi,
+                    'name': manufacturer,
+                    'country_id': country_id, # Foreign key to Country
+                    'region': region_name # String name of the region
+                }
+                # Same location text the merge message shows for a stored row
+                new_factory_locations[wmi] = country_display_name if country_id else region_name or "Unknown"
                 location = country_display_name if country_display_name else region_name or "No Region/Country"
 
-                # Print status only for new records
-                print(f"  ✓ {wmi} -> {manufacturer[:50]}... ({location})")
+                # Log status only for new records
+                log_lines.append(f"  ✓ {wmi} -> {manufacturer[:50]}... ({location})")
                 inserted_count += 1
 
+        if new_factories:
+            insert_factories(list(new_factories.values()))
+
+        # ORM bulk UPDATE by primary key: one executemany for all merged names
+        if merged_names:
+            db.session.execute(
+                update(WmiFactory),
+                [{'id': existing_wmis[wmi].id, 'name': name} for wmi, name in merged_names.items()]
+            )
+
         # Commit all changes
         db.session.commit()
 
+        if log_lines:
+            print("\n".join(log_lines))
+
         print("="*60)
         print(f"✅ Successfully seeded {inserted_count} WMI factory codes!")
         print(f"⟳ Updated {updated_count} existing codes with merged manufacturers")
@@ -1,25 +1,40 @@
 # src/wmi_region_code_seeder.py 
 
+import functools
 import json
 from pathlib import Path
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 
 # Import the models and db session
 from app import db
 from app.models.country import Country
 from app.models.wmi_region import WmiRegion
+from pg_copy import copy_rows
+from vin_constants import KNOWN_REGIONS, VIN_CHAR_INDEX, VIN_CHARACTERS
+
+# Optional: faster (Rust) JSON parser; falls back to the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Configuration
 WMI_DATA_FILE = Path("public_data_sources") / "wmi_region_codes.json"
 
-# Valid VIN characters in order (excluding I, O, Q)
-VIN_CHARACTERS = [
-    'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'J', 'K', 'L', 'M',
-    'N', 'P', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z',
-    '1', '2', '3', '4', '5', '6', '7', '8', '9', '0'
-]
+# New codes are inserted and committed in chunks of this many rows
+INSERT_BATCH_SIZE = 1000
+
+# PostgreSQL: each chunk is COPYed into this temp table (dropped when the chunk
+# commits), then merged into wmi_regions with the conflict check done in the DB
+REGION_STAGING_TABLE = 'wmi_regions_staging'
 
-# List of known regions
-KNOWN_REGIONS = ['Africa', 'Asia', 'Europe', 'North America', 'South America', 'Oceania', 'Antarctica']
+# All 33 two-character codes under each first character (e.g. 'J' -> 'JA'..'J0')
+SINGLE_CHAR_EXPANSIONS = {
+    first_char: tuple(first_char + second_char for second_char in VIN_CHARACTERS)
+    for first_char in VIN_CHARACTERS
+}
 
 # NON-COLLIDING ISO PLACEHOLDER CODES FOR REGIONS
 # Using '0' prefix to guarantee no collision with standard WMI/ISO codes.
@@ -35,29 +50,53 @@ REGION_CODE_MAP = {
 }
 
 # ====================================================================
-# NEW CONFIGURATION: MAPPING FOR INCONSISTENT COUNTRY/REGION NAMES
-# Map names found in the WMI JSON data to the standardized names 
-# used in the 'countries' database table.
+# NEW CONFIGURATION: ALIASES FOR INCONSISTENT COUNTRY/REGION NAMES
+# Each group holds names that mean the same place; names found in the WMI
+# JSON data resolve to whichever one the 'countries' table actually uses
+# (see resolve_name_aliases), so either spelling works in either place.
 # ====================================================================
-NAME_MAPPING = {
-    # WMI JSON Name  : Standardized DB Name
-    "Turkey": "Türkiye",
-    "Czech Republic": "Czechia",
-    "Czechia": "Czech Republic", # If the JSON uses Czechia and the DB uses Czech Republic (Handle both ways)
-    "SA": "South America" # Based on the error: ⚠ Country not found and not a known region: SA (range: 83)
-}
+NAME_ALIASES = (
+    frozenset({"Turkey", "Türkiye"}),
+    frozenset({"Czech Republic", "Czechia"}),
+    frozenset({"SA", "South America"}), # Based on the error: ⚠ Country not found and not a known region: SA (range: 83)
+)
+
+def resolve_name_aliases(countries_by_name):
+    """
+    Map every alias in NAME_ALIASES to its group's canonical name: the member
+    found in countries_by_name, else a known region (created on first use).
+    Groups with neither are left out, so their names pass through unchanged.
+    """
+    canonical_names = {}
+    for group in NAME_ALIASES:
+        canonical = next((name for name in sorted(group) if name.lower() in countries_by_name), None)
+        if canonical is None:
+            canonical = next((name for name in sorted(group) if name in KNOWN_REGIONS), None)
+        if canonical is not None:
+            canonical_names.update(dict.fromkeys(group, canonical))
+    return canonical_names
+
+def normalize_location_name(location_name, canonical_names):
+    """
+    Map a WMI JSON country name to its canonical DB name (from
+    resolve_name_aliases, unchanged if unmapped) and return it with whether
+    it is a known region.
+    """
+    normalized_name = canonical_names.get(location_name, location_name)
+    return normalized_name, normalized_name in KNOWN_REGIONS
 
+@functools.lru_cache(maxsize=None)
 def expand_range(range_str):
-    """Expand a range string into individual 2-character codes."""
-    range_str = range_str.strip()
+    """
+    Expand a range string into a tuple of individual 2-character codes.
+    Many countries share a range string, so each distinct one is expanded once.
+    """
+    # Comma-separated lists are split once here; each part is expanded on its own
+    return tuple(code for part in range_str.split(',') for code in expand_range_part(part.strip()))
+
+def expand_range_part(range_str):
+    """Expand a single comma-free range part (e.g. 'JA-JT', 'K' or 'L5')."""
     codes = []
-    
-    # ... (range expansion logic remains the same)
-    if ',' in range_str:
-        parts = [p.strip() for p in range_str.split(',')]
-        for part in parts:
-            codes.extend(expand_range(part))
-        return codes
 
     if '-' in range_str:
         start, end = range_str.split('-')
@@ -70,68 +109,156 @@ def expand_range(range_str):
             end_second = end[1]
 
             try:
-                start_idx = VIN_CHARACTERS.index(start_second)
-                end_idx = VIN_CHARACTERS.index(end_second)
+                start_idx = VIN_CHAR_INDEX[start_second]
+                end_idx = VIN_CHAR_INDEX[end_second]
 
-                for i in range(start_idx, end_idx + 1):
-                    codes.append(first_char + VIN_CHARACTERS[i])
-            except ValueError as e:
+                if first_char in SINGLE_CHAR_EXPANSIONS:
+                    # Slice of the precomputed codes: no per-code string concatenation
+                    codes.extend(SINGLE_CHAR_EXPANSIONS[first_char][start_idx:end_idx + 1])
+                else:
+                    codes.extend(first_char + second_char for second_char in VIN_CHARACTERS[start_idx:end_idx + 1])
+            except KeyError:
                 pass
         
     elif len(range_str) == 1:
         first_char = range_str
-        for second_char in VIN_CHARACTERS:
-            codes.append(first_char + second_char)
+        if first_char in SINGLE_CHAR_EXPANSIONS:
+            codes.extend(SINGLE_CHAR_EXPANSIONS[first_char])
+        else:
+            # Characters outside the VIN alphabet are still expanded, as before
+            codes.extend(first_char + second_char for second_char in VIN_CHARACTERS)
 
     elif len(range_str) == 2:
         codes.append(range_str)
 
     return codes
 
-def find_or_create_region(location_name):
+def load_countries_by_name():
+    """
+    Map lower-cased common_name -> Country for every row, so region lookups
+    don't need a query each (first row wins, like Country.find_by_name)
+    """
+    countries_by_name = {}
+    for country in Country.query.order_by(Country.id):
+        if country.common_name:
+            countries_by_name.setdefault(country.common_name.lower(), country)
+    return countries_by_name
+
+def region_row(location_name):
+    """Column values for a known region's countries row, with its placeholder ISO codes."""
+    # Get the non-colliding placeholder codes
+    iso_a2_code, iso_a3_code = REGION_CODE_MAP.get(location_name)
+
+    return {
+        'iso_alpha2': iso_a2_code,
+        'iso_alpha3': iso_a3_code,
+        'iso_numeric': '000',
+        'name': location_name,
+        'common_name': location_name,
+        'region': location_name,
+        'subregion': location_name,
+        'flag_emoji': '🌐',
+    }
+
+def find_or_create_region(location_name, countries_by_name=None, log_lines=None):
     """
     Finds a country/region by name or creates a new entry for a region.
     Returns the Country model instance or None.
+
+    countries_by_name (from load_countries_by_name) is used instead of a
+    per-call query when given, and new regions are added to it. Status
+    messages go to log_lines when given, otherwise they are printed.
     """
     # 1. Try to find the existing country/region
-    country = Country.find_by_name(location_name)
+    if countries_by_name is not None:
+        country = countries_by_name.get(location_name.lower())
+    else:
+        country = Country.find_by_name(location_name)
 
     if country:
         return country
 
     # 2. If not found and it's a known region, create it
     if location_name in KNOWN_REGIONS:
-        print(f"➕ Creating new region entry: {location_name}")
-        
-        # Get the non-colliding placeholder codes
-        iso_a2_code, iso_a3_code = REGION_CODE_MAP.get(location_name)
-
-        new_region = Country(
-            iso_alpha2=iso_a2_code,
-            iso_alpha3=iso_a3_code,
-            iso_numeric='000',
-            name=location_name,
-            common_name=location_name,
-            region=location_name,
-            subregion=location_name,
-            flag_emoji='🌐',
-        )
-        db.session.add(new_region)
+        message = f"➕ Creating new region entry: {location_name}"
+        if log_lines is not None:
+            log_lines.append(message)
+        else:
+            print(message)
         
-        # CRITICAL FIX: Commit the new region immediately so subsequent finds work.
+        new_region = Country(**region_row(location_name))
+
+        # Flush (not commit) inside a SAVEPOINT so subsequent finds see the new region;
+        # the seeder commits it with its other work. A failed insert only rolls back the
+        # savepoint, so earlier flushed regions and pending work in the session survive.
         try:
-            db.session.commit()
-            return new_region
-        except Exception as e:
-            db.session.rollback()
-            # If the commit fails due to IntegrityError, another process/autoflush 
-            # beat us to it. We MUST assume it exists now and try to retrieve it.
+            with db.session.begin_nested():
+                db.session.add(new_region)
+        except IntegrityError:
+            # Another process beat us to it. We MUST assume it exists now and try to retrieve it.
             # No need for a print statement here, as it clutters the output.
-            return Country.find_by_name(location_name) # This should succeed now.
+            new_region = Country.find_by_name(location_name) # This should succeed now.
+
+        if countries_by_name is not None and new_region is not None:
+            countries_by_name[location_name.lower()] = new_region
+        return new_region
         
     # 3. Not found and not a known region
     return None
 
+def create_missing_regions(region_names, countries_by_name, log_lines):
+    """
+    Create every region in region_names that has no countries row yet, in one
+    INSERT ... RETURNING, and add the new rows to countries_by_name (rows are
+    flushed, not committed). Falls back to find_or_create_region per name on
+    dialects without executemany RETURNING.
+    """
+    new_names = [name for name in dict.fromkeys(region_names) if name.lower() not in countries_by_name]
+    if not new_names:
+        return
+
+    if not db.engine.dialect.insert_executemany_returning:
+        for name in new_names:
+            find_or_create_region(name, countries_by_name, log_lines)
+        return
+
+    log_lines.extend(f"➕ Creating new region entry: {name}" for name in new_names)
+    new_regions = db.session.scalars(
+        insert(Country).returning(Country, sort_by_parameter_order=True),
+        [region_row(name) for name in new_names],
+    ).all()
+    for new_region in new_regions:
+        countries_by_name[new_region.common_name.lower()] = new_region
+
+def insert_region_codes(rows):
+    """
+    Insert one chunk of new {'code', 'country_id'} rows, skipping codes that
+    appeared since the caller's prefetch (ON CONFLICT (code) DO NOTHING). PostgreSQL gets a COPY into
+    a temp staging table plus one INSERT ... SELECT; other dialects a Core
+    executemany. The caller commits.
+    """
+    # Statements target the Core table, so there is no ORM bulk-insert processing
+    wmi_regions_table = WmiRegion.__table__
+    dialect_name = db.engine.dialect.name
+
+    if dialect_name == 'postgresql':
+        db.session.execute(text(
+            f"CREATE TEMP TABLE {REGION_STAGING_TABLE} (code varchar(2), country_id integer) ON COMMIT DROP"
+        ))
+        copy_rows(REGION_STAGING_TABLE, ('code', 'country_id'), rows)
+        db.session.execute(text(
+            f"INSERT INTO {wmi_regions_table.name} (code, country_id, is_active) "
+            f"SELECT code, country_id, true FROM {REGION_STAGING_TABLE} "
+            f"ON CONFLICT (code) DO NOTHING"
+        ))
+        return
+
+    if dialect_name == 'sqlite':
+        stmt = sqlite_insert(wmi_regions_table).on_conflict_do_nothing(index_elements=['code'])
+    else:
+        stmt = insert(wmi_regions_table)
+    db.session.execute(stmt, rows)
+
 def seed_wmi_region_codes():
     """Seed WMI region codes from JSON file using SQLAlchemy models"""
     
@@ -141,9 +268,15 @@ def seed_wmi_region_codes():
         print(f"❌ Error: {WMI_DATA_FILE} not found. Please run scrape_wmi_regions.py first.")
         return
 
+    # Keep the cached Country rows loaded across the chunk commits, instead of
+    # every one re-SELECTing its attributes after each commit; restored below
+    session = db.session()
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+
     try:
-        with open(WMI_DATA_FILE, "r", encoding="utf-8") as f:
-            wmi_data = json.load(f)
+        with open(WMI_DATA_FILE, 'rb') as f:
+            wmi_data = orjson.loads(f.read()) if orjson is not None else json.load(f)
 
         print("✓ Loaded WMI region codes data")
         print("💾 Processing and inserting into database...")
@@ -152,6 +285,29 @@ def seed_wmi_region_codes():
         skipped_count = 0
         errors = []
 
+        # Fetch every existing code -> country_id once instead of one SELECT per code. Keyed
+        # on code alone like the table's unique index, so a code held by another country is
+        # reported instead of being dropped by ON CONFLICT; queued codes are added as they
+        # go, so in-run duplicates are caught too
+        country_id_by_code = dict(db.session.execute(select(WmiRegion.code, WmiRegion.country_id)).tuples().all())
+        # Every country/region by name, loaded once for find_or_create_region
+        countries_by_name = load_countries_by_name()
+        # Alias -> the spelling the countries table uses, resolved once per run
+        canonical_names = resolve_name_aliases(countries_by_name)
+        # New codes as plain row dicts, inserted and committed every INSERT_BATCH_SIZE rows
+        pending = []
+        # Per-entry status lines, printed in one write each time a chunk is committed
+        log_lines = []
+
+        # Pre-pass over the names only: regions the data needs but the table lacks
+        # are created up front in one batch, so the main loop only ever finds them
+        needed_regions = []
+        for entry in wmi_data:
+            normalized_name, is_region = normalize_location_name(entry.get('country', ''), canonical_names)
+            if is_region:
+                needed_regions.append(normalized_name)
+        create_missing_regions(needed_regions, countries_by_name, log_lines)
+
         for entry in wmi_data:
             range_str = entry.get('range', '')
             location_name = entry.get('country', '')
@@ -159,18 +315,15 @@ def seed_wmi_region_codes():
             # ----------------------------------------------------
             # NEW: Normalize the name from the JSON data
             # ----------------------------------------------------
-            # Use .get() to return the original name if no mapping is found.
-            normalized_name = NAME_MAPPING.get(location_name, location_name)
-            
-            is_region = normalized_name in KNOWN_REGIONS
+            normalized_name, is_region = normalize_location_name(location_name, canonical_names)
 
             # Find or create the Country/Region entry using the NORMALIZED name
-            country_or_region = find_or_create_region(normalized_name)
+            country_or_region = find_or_create_region(normalized_name, countries_by_name, log_lines)
             
             if not country_or_region:
                 # Report the original location name for easier debugging of the JSON source
                 error_msg = f"⚠ Country not found and not a known region: {location_name} (range: {range_str})"
-                print(error_msg)
+                log_lines.append(error_msg)
                 errors.append(error_msg)
                 continue
             
@@ -179,35 +332,52 @@ def seed_wmi_region_codes():
             
             if not codes:
                 error_msg = f"⚠ No codes generated for range: {range_str}"
-                print(error_msg)
+                log_lines.append(error_msg)
                 errors.append(error_msg)
                 continue
             
-            print(f"\n{'📍 Region' if is_region else '🌍 Country'}: {country_or_region.common_name}: {range_str} ({len(codes)} codes)")
+            log_lines.append(f"\n{'📍 Region' if is_region else '🌍 Country'}: {country_or_region.common_name}: {range_str} ({len(codes)} codes)")
             
-            # Insert each code
+            # Insert each code; the id is read once so the inner loop only touches
+            # plain strings, ints and the code dict (no ORM attribute access per code)
+            country_id = country_or_region.id
             for code in codes:
-                # Check if this code already exists for this country
-                existing = WmiRegion.query.filter_by(
-                    code=code,
-                    country_id=country_or_region.id
-                ).first()
-                
-                if existing:
+                # Check if this code already exists, for this country or another one
+                existing_country_id = country_id_by_code.get(code)
+                if existing_country_id == country_id:
                     skipped_count += 1
                     continue
+                if existing_country_id is not None:
+                    error_msg = f"⚠ WMI code {code} already belongs to another country, not assigned to {country_or_region.common_name} (range: {range_str})"
+                    log_lines.append(error_msg)
+                    errors.append(error_msg)
+                    continue
+                country_id_by_code[code] = country_id
                 
-                # Create new WMI region code
-                wmi_code = WmiRegion(
-                    code=code,
-                    country=country_or_region
-                )
-                db.session.add(wmi_code)
+                # Queue new WMI region code
+                pending.append({'code': code, 'country_id': country_id})
                 inserted_count += 1
 
-        # Commit all changes (including new region entries and all WMI codes)
+            # Keep transactions (and the pending list) bounded; the first commit
+            # also persists the region entries created before the loop
+            if len(pending) >= INSERT_BATCH_SIZE:
+                insert_region_codes(pending)
+                db.session.commit()
+                pending = []
+                print("\n".join(log_lines))
+                log_lines = []
+
+        # ON CONFLICT (code) DO NOTHING only guards against codes another seeder
+        # inserted after the prefetch; conflicts known up front are reported above
+        if pending:
+            insert_region_codes(pending)
+
+        # Commit the remaining WMI codes (and the new region entries, if no chunk has yet)
         db.session.commit()
 
+        if log_lines:
+            print("\n".join(log_lines))
+
         print("="*60)
         print(f"✅ Successfully seeded {inserted_count} WMI region codes!")
         print(f"⊘ Skipped {skipped_count} existing entries")
@@ -227,4 +397,6 @@ def seed_wmi_region_codes():
     except Exception as e:
         print(f"❌ Error processing data: {e}")
         db.session.rollback()
-        raise
\ No newline at end of file
+        raise
+    finally:
+        session.expire_on_commit = expire_on_commit
\ No newline at end of file